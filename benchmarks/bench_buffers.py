@@ -0,0 +1,120 @@
+"""Benchmark replay buffer sampling cost and memory per transition.
+
+Run with ``python benchmarks/bench_buffers.py``.
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+from rl_exercises.agent.buffer import ReplayBuffer, SumTree
+
+
+def time_per_call(fn, repeats: int = 200) -> float:  # type: ignore[no-untyped-def]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_sum_tree(batch_size: int = 64) -> None:
+    rng = np.random.default_rng(0)
+    for capacity in [10**3, 10**4, 10**5, 10**6, 4 * 10**6]:
+        tree = SumTree(capacity)
+        tree.update(np.arange(capacity), rng.random(capacity))
+        indices = rng.integers(capacity, size=batch_size)
+        priorities = rng.random(batch_size)
+
+        t_find = time_per_call(
+            partial(lambda tree: tree.find(rng.random(batch_size) * tree.total), tree)
+        )
+        t_update = time_per_call(partial(tree.update, indices, priorities))
+        print(
+            f"SumTree capacity {capacity:>9,d}: sample {batch_size} in "
+            f"{t_find * 1e6:7.1f}us, update {batch_size} in {t_update * 1e6:7.1f}us"
+        )
+
+
+def fake_step(
+    rng: np.random.Generator, step: int, obs_dtype: str = "float32"
+) -> tuple[np.ndarray, dict]:
+    """An 84x84 image observation and an Atari-style info dict."""
+    obs = rng.integers(0, 256, size=(84, 84)).astype(obs_dtype)
+    info = {"lives": 3, "episode_frame_number": step, "frame_number": step}
+    return obs, info
+
+
+def traced_bytes(fill) -> int:  # type: ignore[no-untyped-def]
+    """Memory still allocated after calling `fill`, which returns the storage."""
+    tracemalloc.start()
+    storage = fill()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del storage
+    return allocated
+
+
+def collect_tuples(n_transitions: int, obs_dtype: str, keep_info: bool) -> list:
+    """Transitions as tuples referencing the step's arrays, like SimpleBuffer.
+
+    Consecutive transitions share an observation array, so every observation is
+    held once.
+    """
+    rng = np.random.default_rng(0)
+    transitions = []
+    obs, info = fake_step(rng, 0, obs_dtype)
+    for step in range(n_transitions):
+        next_obs, info = fake_step(rng, step, obs_dtype)
+        transitions.append((obs, 0, 1.0, next_obs, False, info if keep_info else {}))
+        obs = next_obs
+    return transitions
+
+
+def fill_buffer(n_transitions: int, obs_dtype: str) -> ReplayBuffer:
+    """ReplayBuffer with observation columns of the given dtype, one info key.
+
+    States and next states are separate columns, so every observation is copied
+    twice.
+    """
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(
+        capacity=n_transitions,
+        obs_shape=(84, 84),
+        obs_dtype=obs_dtype,
+        info_keys=["lives"],
+    )
+    obs, info = fake_step(rng, 0, obs_dtype)
+    for step in range(n_transitions):
+        next_obs, info = fake_step(rng, step, obs_dtype)
+        buffer.add(obs, 0, 1.0, next_obs, False, info)
+        obs = next_obs
+    return buffer
+
+
+def bench_memory(n_transitions: int = 2_000) -> None:
+    # The same float32 and uint8 observations stored three ways. The
+    # ReplayBuffer drops the info dicts but duplicates every observation, so at
+    # the same dtype it needs about twice the memory of the tuples; it only
+    # comes out ahead when it stores uint8 where the tuples hold float32.
+    for obs_dtype in ["float32", "uint8"]:
+        storages = {
+            "tuples with info": partial(collect_tuples, n_transitions, obs_dtype, True),
+            "tuples without info": partial(
+                collect_tuples, n_transitions, obs_dtype, False
+            ),
+            "ReplayBuffer": partial(fill_buffer, n_transitions, obs_dtype),
+        }
+        for name, fill in storages.items():
+            allocated = traced_bytes(fill)
+            print(
+                f"{obs_dtype:>7} observations, {name:<19}: "
+                f"{allocated / n_transitions:9,.0f} bytes per transition"
+            )
+
+
+if __name__ == "__main__":
+    bench_sum_tree()
+    bench_memory()
@@ -0,0 +1,71 @@
+"""Benchmark batched multi-gamma value iteration against one run per gamma.
+
+Run with ``python benchmarks/bench_value_iteration.py``.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from bench_policy_iteration import random_mdp, timeit
+from rl_exercises.environments import MarsRover
+from rl_exercises.week_2.value_iteration import value_iteration, value_iteration_batched
+
+
+def loop_gammas(T, R_sa, gammas):  # type: ignore[no-untyped-def]
+    """Reference: one value_iteration call per discount factor."""
+    return np.stack([value_iteration(T=T, R_sa=R_sa, gamma=g)[0] for g in gammas])
+
+
+def main() -> None:
+    gammas = np.linspace(0.5, 0.99, 100)
+    rover = MarsRover(
+        transition_probabilities=np.full((10_000, 2), 0.8),
+        rewards=np.arange(10_000) / 10_000,
+    )
+    mdps = {
+        "random nS=100": random_mdp(100, 2),
+        "MarsRover nS=10000": (
+            rover.get_transition_matrix(sparse=True),
+            rover.get_reward_per_action(),
+        ),
+    }
+    for name, (T, R_sa) in mdps.items():
+        t_loop, V_loop = timeit(loop_gammas, T, R_sa, gammas)
+        t_batch, (V_batch, _, _) = timeit(
+            value_iteration_batched, T=T, R_sa=R_sa, gammas=gammas
+        )
+        assert np.allclose(V_loop, V_batch)
+        print(
+            f"{name:20s} K={len(gammas)}: loop {t_loop:8.4f}s, "
+            f"batched {t_batch:8.4f}s, speedup {t_loop / t_batch:6.1f}x"
+        )
+
+    # Prioritized sweeping only backs up states whose residual is above epsilon,
+    # so with a single rewarding state its work does not grow with the MDP size.
+    for n_states in [1_000, 10_000, 100_000]:
+        rewards = np.zeros(n_states)
+        rewards[-1] = 1.0
+        rover = MarsRover(
+            transition_probabilities=np.full((n_states, 2), 0.8), rewards=rewards
+        )
+        T = rover.get_transition_matrix(sparse=True)
+        R_sa = rover.get_reward_per_action()
+        for mode in ["jacobi", "prioritized"]:
+            t, (_, _, info) = timeit(
+                value_iteration,
+                T=T,
+                R_sa=R_sa,
+                gamma=0.9,
+                mode=mode,
+                return_info=True,
+            )
+            iterations = info["iterations"]
+            backups = iterations * n_states if mode == "jacobi" else iterations
+            print(
+                f"value_iteration nS={n_states:6d} {mode:11s}: "
+                f"{backups:9d} state backups, {t:8.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark warm-started value and policy iteration after small MDP changes.
+
+Solves a MarsRover, perturbs its rewards and re-solves from scratch and from
+the previous solution. Run with ``python benchmarks/bench_warm_start.py``.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from bench_policy_iteration import timeit
+from rl_exercises.environments import MarsRover
+from rl_exercises.week_2 import PolicyIteration, ValueIteration
+
+
+def main() -> None:
+    n_states = 1_000
+    rng = np.random.default_rng(0)
+    rewards = rng.random(n_states)
+
+    for agent_cls, kwargs in [
+        (ValueIteration, {}),
+        (PolicyIteration, {"eval_method": "iterative"}),
+    ]:
+        for noise in [1e-3, 1e-2, 1e-1]:
+            env = MarsRover(
+                transition_probabilities=np.full((n_states, 2), 0.8), rewards=rewards
+            )
+            warm = agent_cls(env=env, gamma=0.99, **kwargs)
+            warm.update_agent()
+
+            env.rewards = rewards + noise * rng.standard_normal(n_states)
+            cold = agent_cls(env=env, gamma=0.99, **kwargs)
+            t_cold, _ = timeit(cold.update_agent)
+            t_warm, _ = timeit(warm.update_agent, refit=True)
+            assert np.array_equal(cold.pi, warm.pi)
+            print(
+                f"{agent_cls.__name__:15s} noise={noise:5.0e}: iterations cold "
+                f"{cold.steps:4d}, warm {warm.steps:4d}; time cold {t_cold:7.4f}s, "
+                f"warm {t_warm:7.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
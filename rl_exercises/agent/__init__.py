@@ -1,4 +1,19 @@
 from rl_exercises.agent.abstract_agent import AbstractAgent
-from rl_exercises.agent.buffer import AbstractBuffer, SimpleBuffer
+from rl_exercises.agent.buffer import (
+    AbstractBuffer,
+    MemmapBuffer,
+    NStepBuffer,
+    PrioritizedBuffer,
+    ReplayBuffer,
+    SimpleBuffer,
+)
 
-__all__ = ["AbstractAgent", "AbstractBuffer", "SimpleBuffer"]
+__all__ = [
+    "AbstractAgent",
+    "AbstractBuffer",
+    "MemmapBuffer",
+    "NStepBuffer",
+    "PrioritizedBuffer",
+    "ReplayBuffer",
+    "SimpleBuffer",
+]
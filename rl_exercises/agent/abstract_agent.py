@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import copy
 from abc import abstractmethod
 from typing import Any
 
+import numpy as np
+from rl_exercises.environments import unbatch_info
+
 
 class AbstractAgent(object):
+    # Attributes that hold the policy. If set, `snapshot` copies only these.
+    policy_arrays: tuple[str, ...] = ()
+
     def __init__(self, *args: tuple[Any], **kwargs: dict) -> None:
         """Make agent."""
         pass
@@ -14,6 +21,66 @@ class AbstractAgent(object):
         """Predict action given state."""
         ...
 
+    def predict_actions(
+        self,
+        observations: np.ndarray,
+        infos: dict | None = None,
+        evaluate: bool = False,
+    ) -> tuple[np.ndarray, dict]:
+        """Predict actions for a batch of states.
+
+        The default calls `predict_action` once per observation, with the info
+        dict of that sub-environment. Agents that can serve a whole batch at once
+        should override it.
+
+        Parameters
+        ----------
+        observations : np.ndarray
+            Batch of observations, one per row.
+        infos : dict or None, optional
+            Batched info dict, e.g. from a vector env, see `unbatch_info`.
+        evaluate : bool, optional
+            Evaluation mode toggle, by default False.
+
+        Returns
+        -------
+        tuple[np.ndarray, dict]
+            One action per observation and an empty info dictionary.
+        """
+        infos = {} if infos is None else infos
+        actions = [
+            self.predict_action(observation, unbatch_info(infos, i), evaluate=evaluate)[
+                0
+            ]
+            for i, observation in enumerate(observations)
+        ]
+        return np.asarray(actions), {}
+
+    def snapshot(self) -> AbstractAgent:
+        """Copy the agent so the copy can act while the original keeps training.
+
+        Agents whose policy lives in a few arrays list them in `policy_arrays`.
+        The copy then shares everything but those arrays, and an agent whose
+        ``policy_fitted`` flag is False is fitted first, so the copy never plans
+        on its own. Otherwise the copy is a deep copy that shares the agent's
+        ``env``, if it has one.
+
+        Returns
+        -------
+        AbstractAgent
+            Agent that is not affected by further updates of this one.
+        """
+        if self.policy_arrays:
+            if not getattr(self, "policy_fitted", True):
+                self.update_agent()
+            snapshot = copy.copy(self)
+            for name in self.policy_arrays:
+                setattr(snapshot, name, getattr(self, name).copy())
+            return snapshot
+        env = getattr(self, "env", None)
+        memo = {} if env is None else {id(env): env}
+        return copy.deepcopy(self, memo)
+
     @abstractmethod
     def save(self, *args: tuple[Any], **kwargs: dict) -> Any:
         """Save agent."""
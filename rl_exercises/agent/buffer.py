@@ -3,6 +3,10 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Iterable, Tuple
 
+import json
+import os
+from collections import deque
+
 import numpy as np
 from gymnasium.core import ObsType, SupportsFloat
 
@@ -56,9 +60,13 @@ class AbstractBuffer(ABC):
 
 
 class SimpleBuffer(AbstractBuffer):
-    def __init__(self, *args: tuple, **kwargs: dict) -> None:
+    def __init__(
+        self, *args: tuple, info_keys: list[str] | None = None, **kwargs: dict
+    ) -> None:
         super().__init__()
         self.transition: Transition | None = None
+        # Keep the whole info dict if None, else only these keys
+        self.info_keys = info_keys
 
     def __len__(self) -> int:
         """Return length of buffer (always 1 here).
@@ -96,6 +104,8 @@ class SimpleBuffer(AbstractBuffer):
         info : dict
             Info dict
         """
+        if self.info_keys is not None:
+            info = {key: info[key] for key in self.info_keys if key in info}
         self.transition = (state, action, reward, next_state, done, info)  # type: ignore[assignment]
 
     def sample(self, *args: tuple, **kwargs: dict) -> list[None | Transition]:  # type: ignore[override]
@@ -107,3 +117,716 @@ class SimpleBuffer(AbstractBuffer):
             Iterable (e.g. list) of transitions, length 1 here
         """
         return [self.transition]
+
+
+def _info_scalar(info: dict, key: str) -> float:
+    """Info entry as a float for an info column, NaN if it is missing."""
+    value = info.get(key, np.nan)
+    if np.ndim(value) != 0 or np.asarray(value).dtype.kind not in "biuf":
+        raise ValueError(f"Info entry {key!r} must be a real scalar, got {value!r}.")
+    return float(value)
+
+
+class ReplayBuffer(AbstractBuffer):
+    """Fixed-capacity replay buffer backed by preallocated NumPy arrays.
+
+    Transitions are written to typed column arrays at a circular write index,
+    overwriting the oldest transition once the buffer is full. The columns are
+    allocated on the first `add`, with shape and dtype taken from that transition
+    unless an observation schema is given. Observations are copied into the
+    columns; of the info dict only the values of `info_keys` are kept, each in a
+    float64 column of its own, and the dict itself is dropped. States and next
+    states are separate columns, so consecutive transitions hold their shared
+    observation twice, about double the observation memory of tuples that
+    reference the same arrays.
+
+    Parameters
+    ----------
+    capacity : int
+        Maximum number of stored transitions
+    obs_shape : tuple | None
+        Observation shape, inferred from the first transition if None
+    obs_dtype : str | None
+        Observation dtype, inferred from the first transition if None. Observations
+        are cast to it, e.g. "uint8" stores image observations compactly.
+    info_keys : Iterable[str]
+        Scalar info entries to keep. Missing entries are stored as NaN.
+    seed : int | None
+        Seed for sampling
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        obs_shape: tuple | None = None,
+        obs_dtype: str | None = None,
+        info_keys: Iterable[str] = (),
+        seed: int | None = None,
+        **kwargs: dict,
+    ) -> None:
+        super().__init__()
+        self.capacity = int(capacity)
+        self.obs_shape = None if obs_shape is None else tuple(obs_shape)
+        self.obs_dtype = None if obs_dtype is None else np.dtype(obs_dtype)
+        self.info_keys = tuple(info_keys)
+        self.columns = ("states", "actions", "rewards", "next_states", "dones") + tuple(
+            f"info_{key}" for key in self.info_keys
+        )
+        self.rng = np.random.default_rng(seed)
+        self.position = 0
+        self.size = 0
+        self.data: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        """Return number of stored transitions.
+
+        Returns
+        -------
+        int
+            Buffer length
+        """
+        return self.size
+
+    def _allocate(self, state: np.ndarray, action: float, info: dict) -> None:
+        """Create the column arrays from the schema and the first transition."""
+        state, action = np.asarray(state), np.asarray(action)
+        obs_shape = state.shape if self.obs_shape is None else self.obs_shape
+        obs_dtype = state.dtype if self.obs_dtype is None else self.obs_dtype
+        specs = {
+            "states": (obs_shape, obs_dtype),
+            "actions": (action.shape, action.dtype),
+            "rewards": ((), np.float32),
+            "next_states": (obs_shape, obs_dtype),
+            "dones": ((), np.bool_),
+        }
+        for key in self.info_keys:
+            specs[f"info_{key}"] = ((), np.float64)
+        for name, (shape, dtype) in specs.items():
+            self.data[name] = self._make_column(name, shape, dtype)
+
+    def _make_column(self, name: str, shape: tuple, dtype: np.dtype) -> np.ndarray:
+        """Allocate storage for one column."""
+        return np.empty((self.capacity, *shape), dtype=dtype)
+
+    def add(
+        self,
+        state: np.ndarray,
+        action: float,
+        reward: float,
+        next_state: np.ndarray,
+        done: bool,
+        info: dict,
+    ) -> None:
+        """Add transition to buffer, overwriting the oldest one if full.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State
+        action : float
+            Action
+        reward : float
+            Reward
+        next_state : np.ndarray
+            Next state
+        done : bool
+            Done (terminated or truncated)
+        info : dict
+            Info dict, only the entries in `info_keys` are stored
+
+        Raises
+        ------
+        ValueError
+            If an entry in `info_keys` is not a real scalar
+        """
+        if not self.data:
+            self._allocate(state, action, info)
+        i = self.position
+        self.data["states"][i] = state
+        self.data["actions"][i] = action
+        self.data["rewards"][i] = reward
+        self.data["next_states"][i] = next_state
+        self.data["dones"][i] = done
+        for key in self.info_keys:
+            self.data[f"info_{key}"][i] = _info_scalar(info, key)
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(  # type: ignore[override]
+        self, batch_size: int = 32, *args: tuple, **kwargs: dict
+    ) -> tuple[np.ndarray, ...]:
+        """Sample transitions uniformly with replacement.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of transitions
+
+        Returns
+        -------
+        tuple[np.ndarray, ...]
+            Column arrays (states, actions, rewards, next_states, dones),
+            followed by one column per info key, each with batch_size rows
+
+        Raises
+        ------
+        ValueError
+            If the buffer is empty
+        """
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty buffer.")
+        indices = self.rng.integers(0, self.size, size=batch_size)
+        return self.get(indices)
+
+    def get(self, indices: np.ndarray) -> tuple[np.ndarray, ...]:
+        """Gather the transitions at the given storage indices.
+
+        Parameters
+        ----------
+        indices : np.ndarray
+            Storage indices
+
+        Returns
+        -------
+        tuple[np.ndarray, ...]
+            Column arrays (states, actions, rewards, next_states, dones),
+            followed by one column per info key
+        """
+        return tuple(self.data[name][indices] for name in self.columns)
+
+
+class SumTree:
+    """Array-backed binary sum tree over a fixed number of priorities.
+
+    Leaf i holds the priority of storage slot i and every inner node the sum of
+    its children, so the root is the total priority. Finding the slot for a
+    point in [0, total) and updating priorities both take O(log N).
+
+    Parameters
+    ----------
+    capacity : int
+        Number of leaves
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = int(capacity)
+        self.depth = max(int(np.ceil(np.log2(self.capacity))), 0)
+        self.offset = 2**self.depth
+        # Node 1 is the root, node k has children 2k and 2k + 1
+        self.nodes = np.zeros(2 * self.offset, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        """Sum of all priorities."""
+        return float(self.nodes[1])
+
+    def __getitem__(self, indices: np.ndarray) -> np.ndarray:
+        """Priorities of the given leaves."""
+        return self.nodes[np.asarray(indices) + self.offset]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """Set leaf priorities and recompute the sums above them.
+
+        Parameters
+        ----------
+        indices : np.ndarray
+            Leaf indices
+        priorities : np.ndarray
+            New non-negative priorities
+        """
+        nodes = np.asarray(indices) + self.offset
+        self.nodes[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Find the leaves whose cumulative priority range contains each value.
+
+        Values are clamped below `total`. Rounding in the descent can still end
+        on a leaf with zero priority, which is then replaced by the nearest
+        positive leaf to its left (or the first one if there is none), so only
+        leaves with positive priority are returned while any exist.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Points in [0, total)
+
+        Returns
+        -------
+        np.ndarray
+            Leaf indices, one per value
+        """
+        values = np.clip(
+            np.array(values, dtype=np.float64), 0.0, np.nextafter(self.total, 0.0)
+        )
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.nodes[left]
+            values -= np.where(go_right, self.nodes[left], 0.0)
+            nodes = left + go_right
+        leaves = np.minimum(nodes - self.offset, self.capacity - 1)
+
+        misses = self[leaves] <= 0.0
+        if misses.any():
+            positive = np.flatnonzero(self[np.arange(self.capacity)] > 0.0)
+            if len(positive) > 0:
+                nearest = np.searchsorted(positive, leaves[misses], side="right") - 1
+                leaves[misses] = positive[np.maximum(nearest, 0)]
+        return leaves
+
+
+class PrioritizedBuffer(ReplayBuffer):
+    """Replay buffer with proportional prioritized sampling.
+
+    Transition i is sampled with probability p_i^alpha / sum_j p_j^alpha, using a
+    `SumTree` for O(log N) sampling. New transitions get the highest priority
+    seen so far. Sampling also returns importance-sampling weights and the
+    storage indices needed for `update_priorities`.
+
+    Parameters
+    ----------
+    capacity : int
+        Maximum number of stored transitions
+    alpha : float
+        How strongly priorities skew sampling, 0 is uniform
+    beta : float
+        Importance-sampling correction exponent, 1 fully corrects the bias
+    eps : float
+        Added to absolute TD errors so no transition gets zero priority
+    seed : int | None
+        Seed for sampling
+    **kwargs : dict
+        Schema arguments (obs_shape, obs_dtype, info_keys) of `ReplayBuffer`
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        eps: float = 1e-6,
+        seed: int | None = None,
+        **kwargs: dict,
+    ) -> None:
+        super().__init__(capacity=capacity, seed=seed, **kwargs)
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.tree = SumTree(self.capacity)
+        self.max_priority = 1.0
+
+    def add(
+        self,
+        state: np.ndarray,
+        action: float,
+        reward: float,
+        next_state: np.ndarray,
+        done: bool,
+        info: dict,
+    ) -> None:
+        """Add transition to buffer with maximal priority.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State
+        action : float
+            Action
+        reward : float
+            Reward
+        next_state : np.ndarray
+            Next state
+        done : bool
+            Done (terminated or truncated)
+        info : dict
+            Info dict (not stored)
+        """
+        index = self.position
+        super().add(state, action, reward, next_state, done, info)
+        self.tree.update(np.array([index]), self.max_priority**self.alpha)
+
+    def sample(  # type: ignore[override]
+        self, batch_size: int = 32, *args: tuple, **kwargs: dict
+    ) -> tuple[np.ndarray, ...]:
+        """Sample transitions proportionally to their priority.
+
+        The total priority is split into batch_size equal segments and one
+        transition is drawn from each.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of transitions
+
+        Returns
+        -------
+        tuple[np.ndarray, ...]
+            Column arrays (states, actions, rewards, next_states, dones) and
+            info columns, followed by importance-sampling weights and storage
+            indices
+
+        Raises
+        ------
+        ValueError
+            If the buffer is empty
+        """
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty buffer.")
+        total = self.tree.total
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        # Unfilled slots have zero priority, so find never returns them
+        indices = self.tree.find(values)
+
+        probs = self.tree[indices] / total
+        weights = (self.size * probs) ** -self.beta
+        weights /= weights.max()
+        return (*self.get(indices), weights.astype(np.float32), indices)
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        """Set the priorities of sampled transitions from their TD errors.
+
+        Parameters
+        ----------
+        indices : np.ndarray
+            Storage indices as returned by `sample`
+        td_errors : np.ndarray
+            TD errors of these transitions
+        """
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities**self.alpha)
+
+
+class MemmapBuffer(ReplayBuffer):
+    """Append-only replay buffer stored in `numpy.memmap` column files on disk.
+
+    Every column lives in its own file inside `path`, so the buffer size is
+    bounded by disk rather than RAM. When the files are full they are grown to
+    twice their capacity instead of overwriting old transitions. A `meta.json`
+    file records the column layout, written when the columns are created, and
+    creating a buffer on an existing directory reopens it to resume appending.
+    Schema arguments left at their defaults are then taken from the files,
+    given ones must match them. The number of stored transitions is kept in a
+    memory-mapped counter updated after every addition, so rows written before
+    a crash are not lost.
+
+    Parameters
+    ----------
+    path : str
+        Directory for the column files. Relative paths end up in the Hydra run
+        directory, since Hydra jobs run there.
+    capacity : int
+        Initial number of transitions the files can hold
+    flush_every : int
+        Flush data and metadata to disk after this many additions
+    seed : int | None
+        Seed for sampling
+    **kwargs : dict
+        Schema arguments (obs_shape, obs_dtype, info_keys) of `ReplayBuffer`
+    """
+
+    def __init__(
+        self,
+        path: str = "replay_buffer",
+        capacity: int = 100_000,
+        flush_every: int = 10_000,
+        seed: int | None = None,
+        **kwargs: dict,
+    ) -> None:
+        super().__init__(capacity=capacity, seed=seed, **kwargs)
+        self.path = os.path.abspath(path)
+        self.flush_every = int(flush_every)
+        os.makedirs(self.path, exist_ok=True)
+        reopen = os.path.exists(self._meta_file)
+        counter_file = os.path.join(self.path, "size.dat")
+        self._stored = np.memmap(
+            counter_file,
+            dtype=np.int64,
+            mode="r+" if reopen and os.path.exists(counter_file) else "w+",
+            shape=(1,),
+        )
+        if reopen:
+            self._reopen()
+
+    @property
+    def _meta_file(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _column_file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.dat")
+
+    def _make_column(self, name: str, shape: tuple, dtype: np.dtype) -> np.ndarray:
+        """Create a memory-mapped column file."""
+        return np.memmap(
+            self._column_file(name),
+            dtype=dtype,
+            mode="w+",
+            shape=(self.capacity, *shape),
+        )
+
+    def _allocate(self, state: np.ndarray, action: float, info: dict) -> None:
+        """Create the column files and record their layout right away."""
+        super()._allocate(state, action, info)
+        self._write_meta()
+
+    def _reopen(self) -> None:
+        """Map the column files described by the metadata file.
+
+        Raises
+        ------
+        ValueError
+            If the stored layout does not match the requested schema
+        """
+        with open(self._meta_file) as fh:
+            meta = json.load(fh)
+        states = meta["columns"]["states"]
+        info_keys = tuple(name[5:] for name in list(meta["columns"])[5:])
+        for what, requested, stored in [
+            ("obs_shape", self.obs_shape, tuple(states["shape"])),
+            ("obs_dtype", self.obs_dtype, np.dtype(states["dtype"])),
+            ("info_keys", self.info_keys or None, info_keys),
+        ]:
+            if requested is not None and requested != stored:
+                raise ValueError(
+                    f"{self._meta_file} stores {what}={stored}, requested {requested}."
+                )
+        self.capacity = meta["capacity"]
+        self.size = self.position = max(meta["size"], int(self._stored[0]))
+        self.columns = tuple(meta["columns"])
+        self.info_keys = info_keys
+        for name, spec in meta["columns"].items():
+            self.data[name] = np.memmap(
+                self._column_file(name),
+                dtype=np.dtype(spec["dtype"]),
+                mode="r+",
+                shape=(self.capacity, *spec["shape"]),
+            )
+
+    def _grow(self, capacity: int) -> None:
+        """Extend all column files to hold `capacity` transitions."""
+        self.flush()
+        for name in list(self.data):
+            column = self.data.pop(name)
+            shape, dtype = column.shape[1:], column.dtype
+            del column
+            with open(self._column_file(name), "r+b") as fh:
+                fh.truncate(capacity * int(np.prod(shape)) * dtype.itemsize)
+            self.data[name] = np.memmap(
+                self._column_file(name),
+                dtype=dtype,
+                mode="r+",
+                shape=(capacity, *shape),
+            )
+        self.capacity = capacity
+        self.position = self.size
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        meta = {
+            "capacity": self.capacity,
+            "size": self.size,
+            "columns": {
+                name: {"shape": list(column.shape[1:]), "dtype": column.dtype.str}
+                for name, column in self.data.items()
+            },
+        }
+        with open(self._meta_file, "w") as fh:
+            json.dump(meta, fh)
+
+    def flush(self) -> None:
+        """Write pending changes and the metadata to disk."""
+        if not self.data:
+            return
+        for column in self.data.values():
+            column.flush()  # type: ignore[attr-defined]
+        self._stored.flush()
+        self._write_meta()
+
+    def add(
+        self,
+        state: np.ndarray,
+        action: float,
+        reward: float,
+        next_state: np.ndarray,
+        done: bool,
+        info: dict,
+    ) -> None:
+        """Append transition, growing the files if they are full.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State
+        action : float
+            Action
+        reward : float
+            Reward
+        next_state : np.ndarray
+            Next state
+        done : bool
+            Done (terminated or truncated)
+        info : dict
+            Info dict (not stored)
+        """
+        if self.data and self.size == self.capacity:
+            self._grow(2 * self.capacity)
+        super().add(state, action, reward, next_state, done, info)
+        # Counted only once the row is written
+        self._stored[0] = self.size
+        if self.size % self.flush_every == 0:
+            self.flush()
+
+    def sample(  # type: ignore[override]
+        self, batch_size: int = 32, *args: tuple, **kwargs: dict
+    ) -> tuple[np.ndarray, ...]:
+        """Sample transitions uniformly with replacement.
+
+        Indices are sorted before reading so that the batch is read from disk in
+        file order, and the rows are shuffled afterwards so the batch order is
+        not tied to the storage order.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of transitions
+
+        Returns
+        -------
+        tuple[np.ndarray, ...]
+            Column arrays (states, actions, rewards, next_states, dones),
+            each with batch_size rows
+
+        Raises
+        ------
+        ValueError
+            If the buffer is empty
+        """
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty buffer.")
+        indices = np.sort(self.rng.integers(0, self.size, size=batch_size))
+        order = self.rng.permutation(batch_size)
+        return tuple(np.asarray(column)[order] for column in self.get(indices))
+
+
+class NStepBuffer(AbstractBuffer):
+    """Buffer stage that turns single-step transitions into n-step transitions.
+
+    Incoming transitions wait in a small ring per environment. Once n of them are
+    pending, the oldest is written to the inner buffer with the discounted reward
+    sum r_t + gamma * r_{t+1} + ... + gamma^(n-1) * r_{t+n-1} and the next state
+    s_{t+n}, so learners bootstrap with gamma^n. When an episode ends, all pending
+    transitions are flushed with the shorter remainder of the return. Every
+    forwarded transition carries the number of rewards k it aggregates as
+    ``info["n_steps"]``, so these tails can be bootstrapped with gamma^k. The
+    default inner buffer stores it as its last info column; a given inner
+    `ReplayBuffer` needs "n_steps" in its `info_keys` to keep it.
+
+    Parameters
+    ----------
+    n_steps : int
+        Number of rewards to aggregate
+    gamma : float
+        Discount factor
+    buffer : AbstractBuffer | None
+        Inner buffer receiving the n-step transitions. If None, a `ReplayBuffer`
+        is created from the remaining keyword arguments, with "n_steps" added to
+        its `info_keys`.
+
+    Raises
+    ------
+    ValueError
+        If `n_steps` is less than 1
+    """
+
+    def __init__(
+        self,
+        n_steps: int = 3,
+        gamma: float = 0.99,
+        buffer: AbstractBuffer | None = None,
+        **kwargs: dict,
+    ) -> None:
+        super().__init__()
+        if n_steps < 1:
+            raise ValueError(f"n_steps must be at least 1, got {n_steps}.")
+        self.n_steps = int(n_steps)
+        self.gamma = gamma
+        if buffer is None:
+            info_keys = tuple(kwargs.pop("info_keys", ()))  # type: ignore[arg-type]
+            buffer = ReplayBuffer(info_keys=(*info_keys, "n_steps"), **kwargs)  # type: ignore[arg-type]
+        self.buffer = buffer
+        self.pending: dict[int, deque] = {}
+
+    def __len__(self) -> int:
+        """Return length of the inner buffer.
+
+        Returns
+        -------
+        int
+            Buffer length
+        """
+        return len(self.buffer)  # type: ignore[arg-type]
+
+    def add(
+        self,
+        state: np.ndarray,
+        action: float,
+        reward: float,
+        next_state: np.ndarray,
+        done: bool,
+        info: dict,
+        env_id: int = 0,
+    ) -> None:
+        """Add transition and forward the n-step transitions that are complete.
+
+        Parameters
+        ----------
+        state : np.ndarray
+            State
+        action : float
+            Action
+        reward : float
+            Reward
+        next_state : np.ndarray
+            Next state
+        done : bool
+            Done (terminated or truncated)
+        info : dict
+            Info dict
+        env_id : int
+            Environment the transition comes from, for vectorized collection
+        """
+        pending = self.pending.setdefault(env_id, deque(maxlen=self.n_steps))
+        pending.append((state, action, reward, next_state, done, info))
+        if len(pending) == self.n_steps:
+            self._emit(pending)
+        if done:
+            while pending:
+                self._emit(pending)
+
+    def _emit(self, pending: deque) -> None:
+        """Forward the oldest pending transition with its discounted return."""
+        state, action, _, _, _, info = pending[0]
+        n_step_return = 0.0
+        for k, transition in enumerate(pending):
+            n_step_return += self.gamma**k * transition[2]
+        _, _, _, next_state, done, _ = pending[-1]
+        info = {**info, "n_steps": len(pending)}
+        self.buffer.add(state, action, n_step_return, next_state, done, info)
+        pending.popleft()
+
+    def sample(self, *args: tuple, **kwargs: dict) -> Any:
+        """Sample n-step transitions from the inner buffer.
+
+        Returns
+        -------
+        Any
+            Whatever the inner buffer's `sample` returns. For the default
+            `ReplayBuffer` the last column holds the number of aggregated
+            rewards of each transition.
+        """
+        return self.buffer.sample(*args, **kwargs)
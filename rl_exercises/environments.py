@@ -2,10 +2,13 @@
 
 from __future__ import annotations
 
-from typing import Any, SupportsFloat
+from typing import Any, ClassVar, SupportsFloat
 
 import gymnasium as gym
 import numpy as np
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+from rl_exercises.mdp import SparseTransitions
 
 
 class MarsRover(gym.Env):
@@ -60,8 +63,10 @@ class MarsRover(gym.Env):
         """
         self.rng = np.random.default_rng(seed)
 
-        self.rewards = list(rewards)
-        self.P = np.array(transition_probabilities)
+        # T and R are cached per instance and dropped whenever P or rewards change
+        self._cache: dict[Any, Any] = {}
+        self.P = transition_probabilities
+        self.rewards = rewards
         self.horizon = int(horizon)
         self.current_steps = 0
         self.position = 2  # start at middle
@@ -75,8 +80,35 @@ class MarsRover(gym.Env):
         self.states = np.arange(n)
         self.actions = np.arange(2)
 
-        # transition matrix
-        self.transition_matrix = self.T = self.get_transition_matrix()
+    @property
+    def P(self) -> np.ndarray:
+        """Read-only (num_states, 2) array of action success probabilities."""
+        return self._P
+
+    @P.setter
+    def P(self, value: np.ndarray) -> None:
+        P = np.array(value, dtype=float)
+        if hasattr(self, "_P") and P.shape != self._P.shape:
+            raise ValueError(f"P must have shape {self._P.shape}, got {P.shape}")
+        P.flags.writeable = False
+        self._P = P
+        self._cache.clear()
+
+    @property
+    def rewards(self) -> np.ndarray:
+        """Read-only array with the reward of every position."""
+        return self._rewards
+
+    @rewards.setter
+    def rewards(self, value: list[float] | np.ndarray) -> None:
+        rewards = np.array(value, dtype=float)
+        if rewards.shape != (self.P.shape[0],):
+            raise ValueError(
+                f"Expected {self.P.shape[0]} rewards, got shape {rewards.shape}"
+            )
+        rewards.flags.writeable = False
+        self._rewards = rewards
+        self._cache.clear()
 
     def reset(
         self,
@@ -153,29 +185,39 @@ class MarsRover(gym.Env):
         """
         Return the reward function R[s, a] for each (state, action) pair.
 
-        R[s, a] is the reward for the cell the rover would land in after taking action a in state s.
+        R[s, a] is the expected reward of the cell the rover lands in after taking action a in
+        state s, i.e. the intended move with probability P[s, a] and the flipped move otherwise.
+        The array is cached and read-only.
 
         Returns
         -------
         R : np.ndarray
             A (num_states, num_actions) array of rewards.
         """
-        nS, nA = self.observation_space.n, self.action_space.n
-        R = np.zeros((nS, nA), dtype=float)
-        for s in range(nS):
-            for a in range(nA):
-                nxt = max(0, min(nS - 1, s + (-1 if a == 0 else 1)))
-                R[s, a] = float(self.rewards[nxt])
-        return R
+        if "R" not in self._cache:
+            intended = _next_states(self.states, self.actions)
+            flipped = _next_states(self.states, 1 - self.actions)
+            R = self.P * self.rewards[intended] + (1 - self.P) * self.rewards[flipped]
+            R.flags.writeable = False
+            self._cache["R"] = R
+        return self._cache["R"]
 
     def get_transition_matrix(
         self,
         S: np.ndarray | None = None,
         A: np.ndarray | None = None,
         P: np.ndarray | None = None,
-    ) -> np.ndarray:
+        sparse: bool = False,
+    ) -> np.ndarray | SparseTransitions:
         """
-        Construct a deterministic transition matrix T[s, a, s'].
+        Construct the transition matrix T[s, a, s'].
+
+        With probability P[s, a] the rover makes the intended move, otherwise the
+        flipped one, so every row T[s, a, :] sums to 1. The dense tensor needs
+        num_states² * num_actions floats. With ``sparse=True`` only the two
+        successors of each (s, a) pair are stored.
+        Built from the internal states, actions and P, the result is cached and
+        read-only.
 
         Parameters
         ----------
@@ -185,24 +227,69 @@ class MarsRover(gym.Env):
             Array of actions. Uses internal actions if None.
         P : np.ndarray, optional
             Action success probabilities. Uses internal P if None.
+        sparse : bool, optional
+            Return a `SparseTransitions` instead of a dense tensor, by default False.
 
         Returns
         -------
-        T : np.ndarray
+        T : np.ndarray or SparseTransitions
             A (num_states, num_actions, num_states) tensor where
             T[s, a, s'] = probability of transitioning to s' from s via a.
         """
         if S is None or A is None or P is None:
-            S, A, P = self.states, self.actions, self.P
+            key = ("T", sparse)
+            if key not in self._cache:
+                T = self._build_transition_matrix(
+                    self.states, self.actions, self.P, sparse
+                )
+                for array in (T.next_states, T.probs) if sparse else (T,):
+                    array.flags.writeable = False
+                self._cache[key] = T
+            return self._cache[key]
+        return self._build_transition_matrix(S, A, P, sparse)
+
+    @staticmethod
+    def _build_transition_matrix(
+        S: np.ndarray, A: np.ndarray, P: np.ndarray, sparse: bool
+    ) -> np.ndarray | SparseTransitions:
+        S, A = np.asarray(S), np.asarray(A)
+        P = np.asarray(P, dtype=float)
+        next_states = np.stack([_next_states(S, A), _next_states(S, 1 - A)], axis=-1)
+        P_sa = P[S[:, None], A[None, :]]
+        probs = np.stack([P_sa, 1 - P_sa], axis=-1)
+        if sparse:
+            return SparseTransitions(next_states, probs)
 
         nS, nA = len(S), len(A)
         T = np.zeros((nS, nA, nS), dtype=float)
-        for s in S:
-            for a in A:
-                s_next = max(0, min(nS - 1, s + (-1 if a == 0 else 1)))
-                T[s, a, s_next] = float(P[s, a])
+        # Both branches land in the same cell only if there is a single cell
+        np.add.at(T, (S[:, None, None], A[None, :, None], next_states), probs)
         return T
 
+    @property
+    def transition_matrix(self) -> np.ndarray:
+        """
+        Dense transition tensor T[s, a, s'], cached like `get_transition_matrix`.
+
+        Assigning a tensor replaces the cached dense and sparse models until P or
+        the rewards change.
+        """
+        return self.get_transition_matrix()
+
+    @transition_matrix.setter
+    def transition_matrix(self, value: np.ndarray) -> None:
+        n = self.P.shape[0]
+        T = np.array(value, dtype=float)
+        if T.shape != (n, 2, n):
+            raise ValueError(f"T must have shape {(n, 2, n)}, got {T.shape}")
+        sparse = SparseTransitions.from_dense(T)
+        for array in (T, sparse.next_states, sparse.probs):
+            array.flags.writeable = False
+        self._cache[("T", False)] = T
+        self._cache[("T", True)] = sparse
+
+    T = transition_matrix
+
     def render(self, mode: str = "human"):
         """
         Render the current state of the environment.
@@ -215,6 +302,181 @@ class MarsRover(gym.Env):
         print(f"[MarsRover] pos={self.position}, steps={self.current_steps}")
 
 
+class MarsRoverVec(VectorEnv):
+    """
+    Vectorized MarsRover that steps `num_envs` independent rovers at once.
+
+    All positions live in one NumPy array, so a step costs a single RNG draw and
+    one clipped vector update regardless of the number of rovers. The dynamics
+    match `MarsRover`. Rovers whose episode ended are reset on the following call
+    to `step`, ignoring the action passed for them (gymnasium's NEXT_STEP
+    autoreset mode).
+
+    Parameters
+    ----------
+    num_envs : int, optional
+        Number of rovers, by default 1.
+    transition_probabilities : np.ndarray or None, optional
+        A (num_states, 2) array specifying the probability of actions being
+        followed, all ones for 5 states if None. By default None.
+    rewards : list of float or None, optional
+        Rewards assigned to each position, [1, 0, 0, 0, 10] if None. By default
+        None.
+    horizon : int, optional
+        Maximum number of steps per episode, by default 10.
+    seed : int or None, optional
+        Random seed for reproducibility, by default None.
+    """
+
+    metadata: ClassVar[dict[str, Any]] = {
+        "render_modes": [],
+        "autoreset_mode": AutoresetMode.NEXT_STEP,
+    }
+
+    def __init__(
+        self,
+        num_envs: int = 1,
+        transition_probabilities: np.ndarray | None = None,
+        rewards: list[float] | None = None,
+        horizon: int = 10,
+        seed: int | None = None,
+    ):
+        if transition_probabilities is None:
+            transition_probabilities = np.ones((5, 2))
+        if rewards is None:
+            rewards = [1, 0, 0, 0, 10]
+        self.num_envs = int(num_envs)
+        self.rng = np.random.default_rng(seed)
+
+        self.P = np.array(transition_probabilities, dtype=float)
+        self.rewards = np.array(rewards, dtype=float)
+        self.horizon = int(horizon)
+        self.start_position = 2
+
+        # spaces
+        n = self.P.shape[0]
+        self.single_observation_space = gym.spaces.Discrete(n)
+        self.single_action_space = gym.spaces.Discrete(2)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        self.positions = np.full(self.num_envs, self.start_position, dtype=np.int64)
+        self.current_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self._autoreset = np.zeros(self.num_envs, dtype=bool)
+
+    def reset(
+        self,
+        *,
+        seed: int | None = None,
+        options: dict[str, Any] | None = None,
+    ) -> tuple[np.ndarray, dict[str, Any]]:
+        """
+        Reset all rovers, or those selected by ``options["reset_mask"]``.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Reseeds the shared RNG if given.
+        options : dict, optional
+            May contain a boolean ``"reset_mask"`` of shape (num_envs,).
+
+        Returns
+        -------
+        observations : np.ndarray
+            Positions of all rovers.
+        info : dict
+            An empty info dictionary.
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        mask = slice(None)
+        if options is not None and "reset_mask" in options:
+            mask = np.asarray(options["reset_mask"], dtype=bool)
+
+        self.positions[mask] = self.start_position
+        self.current_steps[mask] = 0
+        self._autoreset[mask] = False
+        return self.positions.copy(), {}
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        """
+        Step all rovers.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            One action (0: left, 1: right) per rover.
+
+        Returns
+        -------
+        observations : np.ndarray
+            The resulting positions.
+        rewards : np.ndarray
+            The rewards at the new positions, 0 for rovers that were reset.
+        terminations : np.ndarray
+            Always False.
+        truncations : np.ndarray
+            Whether each rover reached the time limit.
+        infos : dict
+            An empty dictionary.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs,) or not np.all(
+            (actions == 0) | (actions == 1)
+        ):
+            raise RuntimeError(
+                f"Expected {self.num_envs} actions that are 0 or 1, got {actions}"
+            )
+
+        active = ~self._autoreset
+        # stochastic flip with prob 1 - P[pos, action]
+        follow = self.rng.random(self.num_envs) < self.P[self.positions, actions]
+        delta = np.where(follow == (actions == 1), 1, -1)
+        moved = np.clip(self.positions + delta, 0, self.P.shape[0] - 1)
+
+        self.positions = np.where(active, moved, self.start_position)
+        self.current_steps = np.where(active, self.current_steps + 1, 0)
+        rewards = np.where(active, self.rewards[self.positions], 0.0)
+        terminations = np.zeros(self.num_envs, dtype=bool)
+        truncations = active & (self.current_steps >= self.horizon)
+        self._autoreset = terminations | truncations
+
+        return self.positions.copy(), rewards, terminations, truncations, {}
+
+
+def unbatch_info(infos: dict, index: int) -> dict:
+    """Extract the info dict of one sub-environment from a vector env's infos.
+
+    Nested dicts, like the "episode" entry of a Monitor wrapper, are batched
+    the same way and unbatched recursively.
+
+    Parameters
+    ----------
+    infos : dict
+        Batched infos, where key "_k" masks the sub-environments that set "k"
+    index : int
+        Sub-environment index
+
+    Returns
+    -------
+    dict
+        Info dict of the sub-environment
+    """
+    return {
+        key: unbatch_info(value, index) if isinstance(value, dict) else value[index]
+        for key, value in infos.items()
+        if not key.startswith("_") and infos.get(f"_{key}", np.ones(index + 1))[index]
+    }
+
+
+def _next_states(S: np.ndarray, A: np.ndarray) -> np.ndarray:
+    """Intended next position for every (state, action) pair, clipped to the grid."""
+    moves = np.where(A == 0, -1, 1)
+    return np.clip(S[:, None] + moves[None, :], 0, len(S) - 1)
+
+
 class MarsRoverPartialObsWrapper(gym.Wrapper):
     """
     Partially-observable wrapper for the MarsRover environment.
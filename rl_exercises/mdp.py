@@ -0,0 +1,533 @@
+"""Shared helpers for tabular MDPs with dense or sparse transition models."""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import numpy as np
+import scipy.sparse as sp
+
+# Planners request the sparse transition format from the environment above
+# this many states.
+SPARSE_MIN_STATES = 1_000
+
+
+class SparseTransitions:
+    """
+    Compact transition model storing only the successors of each (s, a) pair.
+
+    Every (state, action) pair has the same number `k` of successor slots.
+    Pairs with fewer successors are padded with zero-probability entries, so
+    memory scales with n_states * n_actions * k instead of n_states².
+
+    Parameters
+    ----------
+    next_states : np.ndarray
+        A (num_states, num_actions, k) integer array of successor states.
+    probs : np.ndarray
+        A (num_states, num_actions, k) array with the probability of each successor.
+    """
+
+    def __init__(self, next_states: np.ndarray, probs: np.ndarray) -> None:
+        next_states = np.asarray(next_states, dtype=np.intp)
+        probs = np.asarray(probs, dtype=float)
+        if next_states.ndim != 3 or next_states.shape != probs.shape:
+            raise ValueError(
+                "next_states and probs must both have shape "
+                f"(num_states, num_actions, k), got {next_states.shape} "
+                f"and {probs.shape}"
+            )
+        self.next_states = next_states
+        self.probs = probs
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        """Shape of the equivalent dense tensor T[s, a, s']."""
+        n_states, n_actions, _ = self.probs.shape
+        return n_states, n_actions, n_states
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the successor and probability arrays."""
+        return self.next_states.nbytes + self.probs.nbytes
+
+    @classmethod
+    def from_dense(cls, T: np.ndarray) -> SparseTransitions:
+        """
+        Convert a dense T[s, a, s'] tensor into the compact format.
+
+        Parameters
+        ----------
+        T : np.ndarray
+            A (num_states, num_actions, num_states) transition tensor.
+
+        Returns
+        -------
+        SparseTransitions
+            The same model with k = max number of successors of any (s, a).
+        """
+        k = max(int(np.max(np.count_nonzero(T, axis=2))), 1)
+        # A stable sort on "is zero" moves the non-zero successors to the front
+        order = np.argsort(T == 0, axis=2, kind="stable")[..., :k]
+        return cls(order, np.take_along_axis(T, order, axis=2))
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Materialize the dense T[s, a, s'] tensor.
+
+        Returns
+        -------
+        np.ndarray
+            A (num_states, num_actions, num_states) transition tensor.
+        """
+        n_states, n_actions, _ = self.shape
+        T = np.zeros(self.shape, dtype=float)
+        s, a = np.indices((n_states, n_actions))
+        np.add.at(T, (s[..., None], a[..., None], self.next_states), self.probs)
+        return T
+
+
+Transitions = np.ndarray | SparseTransitions
+
+
+def expected_values(
+    T: Transitions, V: np.ndarray, states: int | np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Compute sum_s' T[s, a, s'] * V[s'] for all (s, a) or for selected states.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model.
+    V : np.ndarray
+        Value function of shape (num_states,), or a batch of value functions of
+        shape (batch, num_states).
+    states : int or np.ndarray, optional
+        Restrict the computation to these states. All states if None.
+
+    Returns
+    -------
+    np.ndarray
+        Expected next-state values with shape (num_states, num_actions), or the
+        rows of `states` only. A batch of value functions adds a leading batch
+        axis.
+    """
+    if isinstance(T, SparseTransitions):
+        if states is None:
+            return np.sum(T.probs * V[..., T.next_states], axis=-1)
+        return np.sum(T.probs[states] * V[..., T.next_states[states]], axis=-1)
+    T_rows = T if states is None else T[states]
+    if V.ndim == 1:
+        return T_rows @ V
+    return np.moveaxis(T_rows @ V.T, -1, 0)
+
+
+def row_sums(T: Transitions) -> np.ndarray:
+    """
+    Total transition probability of every (s, a) pair.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model.
+
+    Returns
+    -------
+    np.ndarray
+        A (num_states, num_actions) array, all ones for a stochastic model.
+    """
+    if isinstance(T, SparseTransitions):
+        return T.probs.sum(axis=2)
+    return T.sum(axis=2)
+
+
+def validate_transitions(T: Transitions, atol: float = 1e-8) -> None:
+    """
+    Check that T is non-negative and every row T[s, a, :] sums to 1.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model.
+    atol : float, optional
+        Absolute tolerance for the row sums, by default 1e-8.
+
+    Raises
+    ------
+    ValueError
+        If any probability is negative or any row does not sum to 1.
+    """
+    probs = T.probs if isinstance(T, SparseTransitions) else T
+    if np.any(probs < 0):
+        raise ValueError("Transition probabilities must be non-negative.")
+    bad = np.argwhere(np.abs(row_sums(T) - 1.0) > atol)
+    if len(bad):
+        s, a = bad[0]
+        raise ValueError(
+            f"{len(bad)} (state, action) rows do not sum to 1, e.g. T[{s}, {a}, :] "
+            f"sums to {row_sums(T)[s, a]}."
+        )
+
+
+def policy_transitions(T: Transitions, pi: np.ndarray) -> np.ndarray | sp.csr_matrix:
+    """
+    Transition matrix P_pi[s, s'] = T[s, pi[s], s'] of a deterministic policy.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model.
+    pi : np.ndarray
+        Action of the policy in every state.
+
+    Returns
+    -------
+    np.ndarray or scipy.sparse.csr_matrix
+        A (num_states, num_states) matrix, sparse if `T` is sparse.
+    """
+    n_states = T.shape[0]
+    states = np.arange(n_states)
+    if isinstance(T, SparseTransitions):
+        cols = T.next_states[states, pi]
+        rows = np.broadcast_to(states[:, None], cols.shape)
+        return sp.csr_matrix(
+            (T.probs[states, pi].ravel(), (rows.ravel(), cols.ravel())),
+            shape=(n_states, n_states),
+        )
+    return T[states, pi]
+
+
+def span_threshold(epsilon: float, gamma: float) -> float:
+    """
+    Span stopping bound epsilon * (1 - gamma) / (2 * gamma).
+
+    Once the span max(V_new - V) - min(V_new - V) of a Bellman update drops
+    below it, the midpoint-corrected values are within epsilon / 2 of the fixed
+    point and a greedy policy is epsilon-optimal.
+
+    Parameters
+    ----------
+    epsilon : float
+        Tolerance.
+    gamma : float
+        Discount factor.
+
+    Returns
+    -------
+    float
+        The threshold, infinite for gamma = 0.
+    """
+    if gamma == 0:
+        return np.inf
+    return epsilon * (1 - gamma) / (2 * gamma)
+
+
+def span_correction(diff: np.ndarray, gamma: float) -> float:
+    """
+    Constant to add to V_new once the span criterion holds.
+
+    The fixed point lies between the bounds V_new + gamma / (1 - gamma) *
+    min(diff) and V_new + gamma / (1 - gamma) * max(diff). This is the offset
+    of their midpoint.
+
+    Parameters
+    ----------
+    diff : np.ndarray
+        Last Bellman update V_new - V.
+    gamma : float
+        Discount factor (0 ≤ γ < 1).
+
+    Returns
+    -------
+    float
+        Offset of the midpoint estimate.
+    """
+    return gamma / (1 - gamma) * (np.max(diff) + np.min(diff)) / 2
+
+
+def sweeps_saved(delta: float, epsilon: float, gamma: float) -> int:
+    """
+    Further sweeps the max-norm rule would need after an update of size delta.
+
+    Max-norm updates shrink by about gamma per sweep, so reaching epsilon takes
+    log(epsilon / delta) / log(gamma) more. The estimate is negative if delta is
+    already below epsilon.
+
+    Parameters
+    ----------
+    delta : float
+        Largest absolute value change of the last sweep.
+    epsilon : float
+        Max-norm tolerance.
+    gamma : float
+        Discount factor.
+
+    Returns
+    -------
+    int
+        Estimated number of sweeps, 0 if gamma is not in (0, 1) or delta is 0.
+    """
+    if not 0 < gamma < 1 or delta <= 0:
+        return 0
+    return int(np.ceil(np.log(epsilon / delta) / np.log(gamma)))
+
+
+def model_nbytes(*arrays: Any) -> int:
+    """
+    Memory used by dense arrays, SparseTransitions and scipy sparse matrices.
+
+    Parameters
+    ----------
+    *arrays
+        Arrays to measure, None entries are skipped.
+
+    Returns
+    -------
+    int
+        Total number of bytes.
+    """
+    total = 0
+    for array in arrays:
+        if array is None:
+            continue
+        if sp.issparse(array):
+            total += array.data.nbytes + array.indices.nbytes + array.indptr.nbytes
+        else:
+            total += array.nbytes
+    return total
+
+
+class SweepRecorder:
+    """
+    Per-sweep convergence log of a planner, kept in a preallocated array.
+
+    Planners call `start` once and `record` after every sweep (value iteration)
+    or improvement step (policy iteration). A record is one row of a structured
+    array, so leaving the recorder on costs a clock read and a row write per
+    sweep. Any object with these two methods can be passed to the planners
+    instead, e.g. to forward the numbers to a logger.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        Preallocated number of records, doubled when full, by default 10_000.
+
+    Attributes
+    ----------
+    records : np.ndarray
+        Structured array with the fields "time" (seconds spent in the sweep),
+        "residual" (max value change), "policy_changes" (states whose greedy
+        action changed, -1 if not tracked) and "nbytes" (memory held by the
+        planner's arrays). Only the first `len(recorder)` rows are filled.
+    """
+
+    dtype = np.dtype(
+        [
+            ("time", np.float64),
+            ("residual", np.float64),
+            ("policy_changes", np.int64),
+            ("nbytes", np.int64),
+        ]
+    )
+
+    def __init__(self, capacity: int = 10_000) -> None:
+        self.records = np.zeros(capacity, dtype=self.dtype)
+        self.size = 0
+        self._last = time.perf_counter()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def data(self) -> np.ndarray:
+        """The filled records."""
+        return self.records[: self.size]
+
+    def start(self) -> None:
+        """Start timing the first sweep."""
+        self._last = time.perf_counter()
+
+    def record(
+        self, residual: float, policy_changes: int = -1, nbytes: int = 0
+    ) -> None:
+        """
+        Log one sweep, timed since `start` or the previous record.
+
+        Parameters
+        ----------
+        residual : float
+            Max value change of the sweep.
+        policy_changes : int, optional
+            Number of states whose greedy action changed, by default -1.
+        nbytes : int, optional
+            Memory held by the planner's arrays, by default 0.
+        """
+        now = time.perf_counter()
+        if self.size == len(self.records):
+            self.records = np.concatenate([self.records, np.zeros_like(self.records)])
+        self.records[self.size] = (now - self._last, residual, policy_changes, nbytes)
+        self.size += 1
+        self._last = now
+
+    def reset(self) -> None:
+        """Drop all records, keeping the allocated array."""
+        self.size = 0
+
+
+def predecessors(T: Transitions, by_action: bool = False) -> sp.csr_matrix:
+    """
+    Reverse transition index: which states or (state, action) pairs lead to s'.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model.
+    by_action : bool, optional
+        Index (state, action) pairs instead of states, by default False.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        A (num_states, num_states) matrix with entry [s', s] = max_a T[s, a, s'],
+        or with `by_action` a (num_states, num_states * num_actions) matrix with
+        entry [s', s * num_actions + a] = T[s, a, s'], for every transition with
+        non-zero probability. Row s' lists the predecessors of s' in
+        ``indices[indptr[s']:indptr[s' + 1]]``.
+    """
+    n_states, n_actions, _ = T.shape
+    if isinstance(T, SparseTransitions):
+        mask = T.probs > 0
+        s, a, _ = np.nonzero(mask)
+        rows, probs = T.next_states[mask], T.probs[mask]
+    else:
+        s, a, rows = np.nonzero(T)
+        probs = T[s, a, rows]
+    # Repeated successor slots of one (s, a) are summed
+    pairs = sp.csr_matrix(
+        (probs, (rows, s * n_actions + a)), shape=(n_states, n_states * n_actions)
+    )
+    pairs.sum_duplicates()
+    if by_action:
+        return pairs
+
+    # Keep the largest probability over actions for every (s', s) pair
+    pairs = pairs.tocoo()
+    keys, inverse = np.unique(
+        pairs.row * n_states + pairs.col // n_actions, return_inverse=True
+    )
+    data = np.zeros(len(keys))
+    np.maximum.at(data, inverse, pairs.data)
+    return sp.csr_matrix(
+        (data, (keys // n_states, keys % n_states)), shape=(n_states, n_states)
+    )
+
+
+class TabularMDP:
+    """
+    Finite MDP shared by the tabular planners.
+
+    Holds the transition model, the expected rewards and the discount factor,
+    and builds the predecessor indices on first use. Agents given the same
+    instance share these arrays instead of extracting them from the
+    environment again.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions
+        Transition model T[s, a, s'].
+    R_sa : np.ndarray
+        A (num_states, num_actions) array of expected rewards.
+    gamma : float, optional
+        Discount factor, by default 0.9.
+    """
+
+    def __init__(self, T: Transitions, R_sa: np.ndarray, gamma: float = 0.9) -> None:
+        if R_sa.shape != T.shape[:2]:
+            raise ValueError(
+                f"R_sa must have shape {T.shape[:2]} to match T, got {R_sa.shape}"
+            )
+        self.T = T
+        self.R_sa = R_sa
+        self.gamma = gamma
+        # Lazily built indices, shared with copies from `with_gamma`
+        self._index: dict[str, sp.csr_matrix] = {}
+
+    @classmethod
+    def from_env(cls, env: Any, gamma: float = 0.9, sparse: bool = False) -> TabularMDP:
+        """
+        Extract the MDP of an environment with a known model, e.g. MarsRover.
+
+        Parameters
+        ----------
+        env : gymnasium.Env
+            Environment providing `get_transition_matrix` and
+            `get_reward_per_action`.
+        gamma : float, optional
+            Discount factor, by default 0.9.
+        sparse : bool, optional
+            Request the sparse transition format, by default False.
+
+        Returns
+        -------
+        TabularMDP
+            The environment's MDP.
+        """
+        if sparse:
+            T = env.get_transition_matrix(sparse=True)
+        else:
+            T = env.get_transition_matrix()
+        return cls(T, env.get_reward_per_action(), gamma)
+
+    def with_gamma(self, gamma: float) -> TabularMDP:
+        """
+        The same MDP with another discount factor, sharing arrays and indices.
+
+        Parameters
+        ----------
+        gamma : float
+            Discount factor.
+
+        Returns
+        -------
+        TabularMDP
+            MDP with the new discount factor.
+        """
+        mdp = TabularMDP(self.T, self.R_sa, gamma)
+        mdp._index = self._index
+        return mdp
+
+    @property
+    def n_states(self) -> int:
+        """Number of states."""
+        return self.R_sa.shape[0]
+
+    @property
+    def n_actions(self) -> int:
+        """Number of actions."""
+        return self.R_sa.shape[1]
+
+    @property
+    def states(self) -> np.ndarray:
+        """All states, 0 to n_states - 1."""
+        return np.arange(self.n_states)
+
+    @property
+    def actions(self) -> np.ndarray:
+        """All actions, 0 to n_actions - 1."""
+        return np.arange(self.n_actions)
+
+    @property
+    def predecessors(self) -> sp.csr_matrix:
+        """State predecessor index, see :func:`predecessors`."""
+        if "states" not in self._index:
+            self._index["states"] = predecessors(self.T)
+        return self._index["states"]
+
+    @property
+    def predecessor_pairs(self) -> sp.csr_matrix:
+        """(state, action) predecessor index, see :func:`predecessors`."""
+        if "pairs" not in self._index:
+            self._index["pairs"] = predecessors(self.T, by_action=True)
+        return self._index["pairs"]
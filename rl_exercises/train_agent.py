@@ -18,19 +18,28 @@ try:
     import compiler_gym
 except:  # noqa: E722
     warnings.warn("Could not import compiler_gym. Probably it is not installed.")
-from typing import Any, List, SupportsFloat
+from typing import Any, SupportsFloat
 
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import partial
 
 from rl_exercises.agent.abstract_agent import AbstractAgent
-from rl_exercises.agent.buffer import SimpleBuffer
-from rl_exercises.environments import MarsRover
+from rl_exercises.agent.buffer import (
+    AbstractBuffer,
+    MemmapBuffer,
+    NStepBuffer,
+    PrioritizedBuffer,
+    ReplayBuffer,
+    SimpleBuffer,
+)
+from rl_exercises.environments import MarsRover, MarsRoverVec, unbatch_info
 from rl_exercises.week_2 import PolicyIteration, ValueIteration
 
 # from rl_exercises.week_4 import EpsilonGreedyPolicy as TabularEpsilonGreedyPolicy
 # from rl_exercises.week_4 import SARSAAgent
 # from rl_exercises.week_5 import EpsilonGreedyPolicy, TabularQAgent, VFAQAgent
-# from rl_exercises.week_6 import DQN, ReplayBuffer
+# from rl_exercises.week_6 import DQN
 # from rl_exercises.week_7 import REINFORCE
 # from rl_exercises.week_8 import EpsilonDecayPolicy, EZGreedyPolicy
 from stable_baselines3 import PPO, SAC
@@ -57,11 +66,18 @@ def train(cfg: DictConfig) -> float:
     NotImplementedError
         _description_
     """
-    env = make_env(cfg.env_name)
     printr(cfg)
     if cfg.agent == "sb3":
-        return train_sb3(env, cfg)
-    elif cfg.agent in ["policy_iteration", "value_iteration"]:
+        return train_sb3(make_env(cfg.env_name, cfg.env_kwargs), cfg)
+
+    vectorized = cfg.num_envs > 1
+    if vectorized:
+        # Only the vector env is stepped. The agent still needs a single env
+        # for its spaces and model, so it gets a bare one without a Monitor.
+        env = make_env(cfg.env_name, cfg.env_kwargs, monitor_filename=None)
+    else:
+        env = make_env(cfg.env_name, cfg.env_kwargs)
+    if cfg.agent in ["policy_iteration", "value_iteration"]:
         agent = eval(cfg.agent_class)(env=env, **cfg.agent_kwargs)
     elif cfg.agent in ["tabular_q_learning", "vfa_q_learning", "dqn"]:
         policy_class = eval(cfg.policy_class)
@@ -74,8 +90,21 @@ def train(cfg: DictConfig) -> float:
 
     buffer_cls = eval(cfg.buffer_cls)
     buffer = buffer_cls(**cfg.buffer_kwargs)
-    state, info = env.reset()
+    evaluator = Evaluator(cfg, make_eval_env(cfg), asynchronous=cfg.async_eval)
+
+    if vectorized:
+        env.close()
+        envs = make_vec_env(
+            cfg.env_name,
+            cfg.env_kwargs,
+            cfg.num_envs,
+            vector_mode=cfg.vector_mode,
+            monitor_filename="train",
+        )
+        train_vectorized(envs, agent, buffer, cfg, evaluator)
+        return finish_training(cfg, envs, agent, buffer, evaluator)
 
+    state, info = env.reset()
     for step in range(cfg.training_steps):
         action, info = agent.predict_action(state, info)
         next_state, reward, terminated, truncated, info = env.step(action)
@@ -94,13 +123,252 @@ def train(cfg: DictConfig) -> float:
             state, info = env.reset()
 
         if step % cfg.eval_every_n_steps == 0:
-            eval_performance = evaluate(
-                make_env(cfg.env_name, cfg.env_kwargs), agent, cfg.n_eval_episodes
+            evaluator.submit(step, agent)
+
+    return finish_training(cfg, env, agent, buffer, evaluator)
+
+
+def train_vectorized(
+    envs: gym.vector.VectorEnv,
+    agent: AbstractAgent,
+    buffer: AbstractBuffer,
+    cfg: DictConfig,
+    evaluator: "Evaluator",
+) -> None:
+    """Collect experience from a vector env and update the agent.
+
+    Every call to `envs.step` advances all sub-environments, so one iteration
+    counts as `num_envs` training steps. Assumes the NEXT_STEP autoreset mode of
+    gymnasium vector envs: the step that resets a finished sub-environment is
+    not stored in the buffer.
+
+    Parameters
+    ----------
+    envs : gym.vector.VectorEnv
+        Training environments
+    agent : AbstractAgent
+        Agent to train
+    buffer : AbstractBuffer
+        Buffer receiving the transitions
+    cfg : DictConfig
+        Agent/experiment configuration
+    evaluator : Evaluator
+        Runs the periodic evaluations
+    """
+    num_envs = envs.num_envs
+    states, infos = envs.reset()
+    autoreset = np.zeros(num_envs, dtype=bool)
+
+    for step in range(0, cfg.training_steps, num_envs):
+        actions, _ = agent.predict_actions(states, infos)
+        next_states, rewards, terminated, truncated, infos = envs.step(actions)
+        dones = terminated | truncated
+
+        for i in np.flatnonzero(~autoreset):
+            # NStepBuffer keeps the transitions of each sub-environment apart
+            env_id = {"env_id": i} if isinstance(buffer, NStepBuffer) else {}
+            buffer.add(
+                states[i],
+                actions[i],
+                rewards[i],
+                next_states[i],
+                dones[i],
+                unbatch_info(infos, i),
+                **env_id,
             )
-            print(f"Eval reward after {step} steps was {eval_performance}.")
 
+        if len(buffer) > cfg.batch_size or (
+            cfg.update_after_episode_end and dones.any()
+        ):
+            batch = buffer.sample(cfg.batch_size)
+            agent.update_agent(batch)
+
+        states = next_states
+        autoreset = dones
+
+        if step % cfg.eval_every_n_steps < num_envs:
+            evaluator.submit(step, agent)
+
+
+def log_evaluation(step: int, eval_performance: float) -> None:
+    """Print the result of a periodic evaluation.
+
+    Parameters
+    ----------
+    step : int
+        Training step the evaluated agent was taken at
+    eval_performance : float
+        Mean return of the evaluation episodes
+    """
+    print(f"Eval reward after {step} steps was {eval_performance}.")
+
+
+class Evaluator:
+    """Run periodic evaluations, optionally in a background thread.
+
+    In asynchronous mode `submit` evaluates a snapshot of the agent (see
+    `AbstractAgent.snapshot`) on a worker thread and returns immediately, so
+    training continues during the evaluation. Evaluations share one environment
+    and therefore run one after another, in submission order.
+
+    Parameters
+    ----------
+    cfg : DictConfig
+        Agent/experiment configuration
+    eval_env : gym.Env | gym.vector.VectorEnv
+        Environment from `make_eval_env`
+    asynchronous : bool, optional
+        Evaluate in a background thread, by default False
+    callback : Callable[[int, float], None] | None, optional
+        Called with the training step and the mean return of every evaluation,
+        by default `log_evaluation`
+    """
+
+    def __init__(
+        self,
+        cfg: DictConfig,
+        eval_env: gym.Env | gym.vector.VectorEnv,
+        asynchronous: bool = False,
+        callback: Callable[[int, float], None] | None = None,
+    ) -> None:
+        self.cfg = cfg
+        self.eval_env = eval_env
+        self.callback = log_evaluation if callback is None else callback
+        self.results: list[tuple[int, float]] = []
+        self.executor = ThreadPoolExecutor(max_workers=1) if asynchronous else None
+        self.pending: list[Future] = []
+
+    def submit(self, step: int, agent: AbstractAgent) -> None:
+        """Evaluate the agent as of training step `step`.
+
+        Parameters
+        ----------
+        step : int
+            Current training step
+        agent : AbstractAgent
+            Agent to evaluate
+        """
+        if self.executor is None:
+            self._evaluate(step, agent)
+        else:
+            self.pending.append(
+                self.executor.submit(self._evaluate, step, agent.snapshot())
+            )
+
+    def _evaluate(self, step: int, agent: AbstractAgent) -> None:
+        eval_performance = evaluate_from_config(self.cfg, agent, self.eval_env)
+        self.results.append((step, eval_performance))
+        self.callback(step, eval_performance)
+
+    def wait(self) -> list[tuple[int, float]]:
+        """Block until all submitted evaluations are done.
+
+        Returns
+        -------
+        list[tuple[int, float]]
+            (step, mean return) of all evaluations so far
+
+        Raises
+        ------
+        Exception
+            The first exception raised by a background evaluation
+        """
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+        return self.results
+
+    def close(self) -> None:
+        """Wait for pending evaluations, then close the worker and environment."""
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.eval_env.close()
+
+
+def make_eval_env(cfg: DictConfig) -> gym.Env | gym.vector.VectorEnv:
+    """Make the evaluation environment as configured.
+
+    The environment is created once per run and reused by every evaluation, so
+    that start-up costs are paid only once. Its Monitor logs to "eval" instead of
+    overwriting the training log.
+
+    Parameters
+    ----------
+    cfg : DictConfig
+        Agent/experiment configuration
+
+    Returns
+    -------
+    gym.Env | gym.vector.VectorEnv
+        Vector env with n_eval_envs sub-environments if n_eval_envs > 1, else a
+        single env
+    """
+    if cfg.n_eval_envs > 1:
+        return make_vec_env(cfg.env_name, cfg.env_kwargs, cfg.n_eval_envs)
+    return make_env(cfg.env_name, cfg.env_kwargs, monitor_filename="eval")
+
+
+def evaluate_from_config(
+    cfg: DictConfig, agent: AbstractAgent, eval_env: gym.Env | gym.vector.VectorEnv
+) -> float:
+    """Evaluate the agent on the persistent evaluation environment.
+
+    Parameters
+    ----------
+    cfg : DictConfig
+        Agent/experiment configuration
+    agent : AbstractAgent
+        Agent to evaluate
+    eval_env : gym.Env | gym.vector.VectorEnv
+        Environment from `make_eval_env`, left open
+
+    Returns
+    -------
+    float
+        Mean return of n eval episodes
+    """
+    if isinstance(eval_env, gym.vector.VectorEnv):
+        return evaluate_vectorized(
+            eval_env, agent, cfg.n_eval_episodes, close_env=False
+        )["mean"]
+    return evaluate(eval_env, agent, cfg.n_eval_episodes, close_env=False)
+
+
+def finish_training(
+    cfg: DictConfig,
+    env: gym.Env | gym.vector.VectorEnv,
+    agent: AbstractAgent,
+    buffer: AbstractBuffer,
+    evaluator: "Evaluator",
+) -> float:
+    """Save the agent, run the final evaluation and close the environments.
+
+    Parameters
+    ----------
+    cfg : DictConfig
+        Agent/experiment configuration
+    env : gym.Env | gym.vector.VectorEnv
+        Training environment
+    agent : AbstractAgent
+        Trained agent
+    buffer : AbstractBuffer
+        Training buffer
+    evaluator : Evaluator
+        Evaluator of the run, waited for and closed
+
+    Returns
+    -------
+    float
+        Mean return of n eval episodes
+    """
+    if isinstance(buffer, MemmapBuffer):
+        buffer.flush()
     agent.save(str(os.path.abspath("model.csv")))
-    final_eval = evaluate(env, agent, cfg.n_eval_episodes)
+    evaluator.wait()
+    final_eval = evaluate_from_config(cfg, agent, evaluator.eval_env)
+    evaluator.close()
+    env.close()
     print(f"Final eval reward was: {final_eval}")
     return final_eval
 
@@ -143,7 +411,9 @@ def train_sb3(env: gym.Env, cfg: DictConfig) -> float:
     return performance
 
 
-def evaluate(env: gym.Env, agent: AbstractAgent, episodes: int = 100) -> float:
+def evaluate(
+    env: gym.Env, agent: AbstractAgent, episodes: int = 100, close_env: bool = True
+) -> float:
     """Evaluate a given Policy on an Environment.
 
     Parameters
@@ -154,13 +424,15 @@ def evaluate(env: gym.Env, agent: AbstractAgent, episodes: int = 100) -> float:
         Policy to evaluate
     episodes: int
         Evaluation episodes
+    close_env: bool
+        Close the environment afterwards, keep it open for reuse if False
 
     Returns
     -------
     float
         Mean evaluation rewards
     """
-    episode_rewards: List[float] = []
+    episode_rewards: list[float] = []
     pbar = tqdm(total=episodes)
     for _ in range(episodes):
         obs, info = env.reset()
@@ -181,11 +453,138 @@ def evaluate(env: gym.Env, agent: AbstractAgent, episodes: int = 100) -> float:
                     }
                 )
         pbar.update(1)
-    env.close()
+    if close_env:
+        env.close()
     return np.mean(episode_rewards)
 
 
-def make_env(env_name: str, env_kwargs: dict = {}) -> gym.Env:
+def evaluate_vectorized(
+    envs: gym.vector.VectorEnv,
+    agent: AbstractAgent,
+    episodes: int = 100,
+    close_env: bool = True,
+) -> dict[str, float]:
+    """Evaluate a given Policy on a vector env, running episodes in lock-step.
+
+    Episodes are spread evenly over the sub-environments so that short episodes
+    are not over-represented. All observations go to the agent's
+    ``predict_actions`` in one call. Assumes the NEXT_STEP autoreset mode of
+    gymnasium vector envs.
+
+    Parameters
+    ----------
+    envs: gym.vector.VectorEnv
+        Vector environment to evaluate on
+    agent: AbstractAgent
+        Agent to evaluate
+    episodes: int
+        Evaluation episodes, at least 1
+    close_env: bool
+        Close the environment afterwards, keep it open for reuse if False
+
+    Returns
+    -------
+    dict[str, float]
+        Mean, standard deviation and quantiles of the episode returns
+
+    Raises
+    ------
+    ValueError
+        If `episodes` is smaller than 1
+    """
+    if episodes < 1:
+        raise ValueError(f"episodes must be at least 1, got {episodes}.")
+    n = envs.num_envs
+    targets = np.array([(episodes + i) // n for i in range(n)])
+    counts = np.zeros(n, dtype=int)
+    running = np.zeros(n)
+    episode_rewards: list[float] = []
+
+    obs, infos = envs.reset()
+    while np.any(counts < targets):
+        actions, _ = agent.predict_actions(obs, infos, evaluate=True)
+        obs, rewards, terminated, truncated, infos = envs.step(actions)
+        running += rewards
+        done = terminated | truncated
+        finished = np.flatnonzero(done & (counts < targets))
+        episode_rewards.extend(running[finished])
+        counts[finished] += 1
+        running[done] = 0.0
+    if close_env:
+        envs.close()
+
+    returns = np.array(episode_rewards)
+    q25, median, q75 = np.quantile(returns, [0.25, 0.5, 0.75])
+    return {
+        "mean": float(np.mean(returns)),
+        "std": float(np.std(returns)),
+        "min": float(np.min(returns)),
+        "q25": float(q25),
+        "median": float(median),
+        "q75": float(q75),
+        "max": float(np.max(returns)),
+    }
+
+
+def make_vec_env(
+    env_name: str,
+    env_kwargs: dict | None = None,
+    num_envs: int = 1,
+    vector_mode: str = "sync",
+    monitor_filename: str | None = None,
+) -> gym.vector.VectorEnv:
+    """Make a vector environment based on name and kwargs.
+
+    MarsRover uses the natively batched `MarsRoverVec`. All other environments
+    are `make_env` instances, stepped one after another in the main process
+    ("sync") or in parallel, one subprocess each ("async").
+
+    Parameters
+    ----------
+    env_name : str
+        Environment name
+    env_kwargs : dict | None, optional
+        Optional env config, by default None
+    num_envs : int, optional
+        Number of sub-environments, by default 1
+    vector_mode : str, optional
+        "sync" or "async", by default "sync"
+    monitor_filename : str | None, optional
+        Sub-environment i logs to "<monitor_filename>_<i>", no Monitor if None,
+        by default None
+
+    Returns
+    -------
+    gym.vector.VectorEnv
+        Instantiated vector env
+
+    Raises
+    ------
+    ValueError
+        If vector_mode is unknown
+    """
+    env_kwargs = env_kwargs or {}
+    if env_name == "MarsRover":
+        return MarsRoverVec(num_envs=num_envs, **env_kwargs)
+    env_fns = [
+        partial(
+            make_env,
+            env_name,
+            env_kwargs,
+            None if monitor_filename is None else f"{monitor_filename}_{i}",
+        )
+        for i in range(num_envs)
+    ]
+    if vector_mode == "sync":
+        return gym.vector.SyncVectorEnv(env_fns)
+    if vector_mode == "async":
+        return gym.vector.AsyncVectorEnv(env_fns)
+    raise ValueError(f"Unknown vector_mode {vector_mode!r}, use 'sync' or 'async'.")
+
+
+def make_env(
+    env_name: str, env_kwargs: dict = {}, monitor_filename: str | None = "train"
+) -> gym.Env:
     """Make environment based on name and kwargs.
 
     Parameters
@@ -194,6 +593,8 @@ def make_env(env_name: str, env_kwargs: dict = {}) -> gym.Env:
         Environment name
     env_kwargs : dict, optional
         Optional env config, by default {}
+    monitor_filename : str | None, optional
+        File the Monitor wrapper logs to, no Monitor if None, by default "train"
 
     Returns
     -------
@@ -231,7 +632,8 @@ def make_env(env_name: str, env_kwargs: dict = {}) -> gym.Env:
         env = FlatObsWrapper(env)
     else:
         env = gym.make(env_name, **env_kwargs)
-    env = Monitor(env, filename="train")
+    if monitor_filename is not None:
+        env = Monitor(env, filename=monitor_filename)
     return env
 
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import gymnasium as gym
 import numpy as np
+from rl_exercises.mdp import SparseTransitions
 
 
 class MyEnv(gym.Env):
@@ -52,12 +53,14 @@ class MyEnv(gym.Env):
     def get_reward_per_action(self):
         return np.array([[0, 1], [0, 1]])  # Rewards for (state, action)
 
-    def get_transition_matrix(self):
+    def get_transition_matrix(self, sparse=False):
         T = np.zeros((2, 2, 2))  # (n_states, n_actions, n_states)
         T[0, 0, 0] = 1  # From state 0, action 0 -> state 0
         T[0, 1, 1] = 1  # From state 0, action 1 -> state 1
         T[1, 0, 0] = 1  # From state 1, action 0 -> state 0
         T[1, 1, 1] = 1  # From state 1, action 1 -> state 1
+        if sparse:
+            return SparseTransitions.from_dense(T)
         return T
 
 
@@ -5,8 +5,30 @@ from typing import Any
 import warnings
 
 import numpy as np
+import scipy.sparse as sp
 from rl_exercises.agent import AbstractAgent
 from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import (
+    SPARSE_MIN_STATES,
+    SweepRecorder,
+    TabularMDP,
+    Transitions,
+    expected_values,
+    model_nbytes,
+    policy_transitions,
+    row_sums,
+    span_correction,
+    span_threshold,
+    sweeps_saved,
+)
+from scipy.sparse.linalg import spsolve
+
+# Up to this many states policy_evaluation(method="solve") uses dense LU,
+# above it a sparse solver.
+DENSE_SOLVE_MAX_STATES = 1_000
+# Up to this many states the PolicyIteration agent evaluates policies with a
+# direct solve, above it iteratively.
+SOLVE_MAX_STATES = 100_000
 
 
 class PolicyIteration(AbstractAgent):
@@ -27,14 +49,59 @@ class PolicyIteration(AbstractAgent):
         Random seed for policy initialization, by default 333.
     filename : str, optional
         Path to save/load the policy, by default "policy.npy".
+    eval_method : str or None, optional
+        Policy evaluation method, ``"iterative"`` or ``"solve"``. If None, it is
+        picked by state count: ``"solve"`` up to ``SOLVE_MAX_STATES`` states,
+        ``"iterative"`` above. By default None.
+    sparse : bool or None, optional
+        Whether to request the sparse transition format from the environment.
+        If None, it is used above ``SPARSE_MIN_STATES`` states. By default None.
+    initial_policy : np.ndarray or None, optional
+        Policy to start policy iteration from, all zeros if None. By default None.
+    eval_sweeps : int or None, optional
+        Evaluation sweeps per improvement step for modified policy iteration,
+        see `policy_iteration`. Implies ``eval_method="iterative"`` if that is
+        None. By default None, i.e. evaluate to convergence.
+    eval_stopping : str, optional
+        Stopping rule of iterative policy evaluation, ``"max-norm"`` or
+        ``"span"``, see `policy_evaluation`. By default "max-norm".
+    mdp : TabularMDP or None, optional
+        MDP to plan on, e.g. shared with another agent. Its discount factor
+        replaces `gamma`. If None, it is extracted from `env` on the first
+        update. By default None.
+    recorder : SweepRecorder or None, optional
+        Receives per-step statistics of every policy iteration run, see
+        `policy_iteration`. By default None.
+
+    Attributes
+    ----------
+    steps : int
+        Number of improvement steps of the last policy iteration run.
+    info : dict
+        Totals of the last run's policy evaluations: "eval_sweeps" and the
+        estimated "sweeps_saved" compared to the ``"max-norm"`` rule.
+
+    Raises
+    ------
+    ValueError
+        If `eval_sweeps` is less than 1.
     """
 
+    policy_arrays = ("pi",)
+
     def __init__(
         self,
         env: MarsRover,
         gamma: float = 0.9,
         seed: int = 333,
         filename: str = "policy.npy",
+        eval_method: str | None = None,
+        sparse: bool | None = None,
+        initial_policy: np.ndarray | None = None,
+        eval_sweeps: int | None = None,
+        eval_stopping: str = "max-norm",
+        mdp: TabularMDP | None = None,
+        recorder: SweepRecorder | None = None,
         **kwargs: dict,
     ) -> None:
         if hasattr(env, "unwrapped"):
@@ -51,20 +118,36 @@ class PolicyIteration(AbstractAgent):
         self.n_obs = self.env.observation_space.n  # type: ignore[attr-defined]
         self.n_actions = self.env.action_space.n  # type: ignore[attr-defined]
 
+        if eval_sweeps is not None and eval_sweeps < 1:
+            raise ValueError(f"eval_sweeps must be at least 1, got {eval_sweeps}.")
+        if eval_method is None and eval_sweeps is None:
+            eval_method = "solve" if self.n_obs <= SOLVE_MAX_STATES else "iterative"
+        elif eval_method is None:
+            eval_method = "iterative"
+        self.eval_method = eval_method
+        self.eval_sweeps = eval_sweeps
+        self.eval_stopping = eval_stopping
+        self.recorder = recorder
+        if sparse is None:
+            sparse = self.n_obs > SPARSE_MIN_STATES
+        self.sparse = sparse
+
         # TODO: Get the MDP components (states, actions, transitions, rewards)
         self.S = None
         self.A = None
         self.T = None
         self.R = None
-        self.gamma = gamma
+        self.mdp = mdp
+        self.gamma = gamma if mdp is None else mdp.gamma
         self.R_sa = None
 
         # TODO: Initialize policy and Q-values
-        self.pi = None
+        self.pi = None if initial_policy is None else np.array(initial_policy)
         self.Q = None
 
         self.policy_fitted: bool = False
         self.steps: int = 0
+        self.info: dict[str, Any] = {}
 
     def predict_action(  # type: ignore[override]
         self, observation: int, info: dict | None = None, evaluate: bool = False
@@ -89,24 +172,65 @@ class PolicyIteration(AbstractAgent):
         action = self.pi[observation]  # Select action based on the current policy
         return action, {}
 
-    def update_agent(self, *args: tuple, **kwargs: dict) -> None:
-        """Run policy iteration to compute the optimal policy and state-action values."""
-        if not self.policy_fitted:
-            # Initialize MDP components
-            self.S = np.arange(self.n_obs)
-            self.A = np.arange(self.n_actions)
-            self.T = self.env.get_transition_matrix()
-            self.R_sa = self.env.get_reward_per_action()
+    def predict_actions(
+        self,
+        observations: np.ndarray,
+        infos: dict | None = None,
+        evaluate: bool = False,
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Predict actions for a batch of observations with one policy lookup.
 
-            # Initialize policy and Q-values
-            self.pi = np.zeros(self.n_obs, dtype=int)
-            self.Q = np.zeros((self.n_obs, self.n_actions))
+        Parameters
+        ----------
+        observations : np.ndarray
+            Batch of observations/states.
+        infos : dict or None, optional
+            Additional info passed during prediction (unused).
+        evaluate : bool, optional
+            Evaluation mode toggle (unused here), by default False.
+
+        Returns
+        -------
+        tuple[np.ndarray, dict]
+            The selected actions and an empty info dictionary.
+        """
+        return self.pi[np.asarray(observations)], {}
+
+    def update_agent(self, *args: tuple, refit: bool = False, **kwargs: dict) -> None:
+        """Run policy iteration to compute the optimal policy and state-action values.
+
+        Policy iteration starts from the current policy, e.g. a loaded one, and
+        its values if known. Pass ``refit=True`` to extract the MDP from the
+        environment again and solve it after the environment changed.
+        """
+        if not self.policy_fitted or refit:
+            # Initialize MDP components
+            if self.mdp is None or refit:
+                self.mdp = TabularMDP.from_env(self.env, self.gamma, self.sparse)
+            self.S, self.A = self.mdp.states, self.mdp.actions
+            self.T, self.R_sa = self.mdp.T, self.mdp.R_sa
+
+            # Initialize policy and Q-values, warm-started from a previous fit
+            V0 = None
+            if self.pi is None:
+                self.pi = np.zeros(self.n_obs, dtype=int)
+            elif self.Q is not None:
+                V0 = self.Q[self.S, self.pi]
+            if self.Q is None:
+                self.Q = np.zeros((self.n_obs, self.n_actions))
 
             # Run policy iteration
-            self.Q, self.pi, self.steps = policy_iteration(
+            self.Q, self.pi, self.steps, self.info = policy_iteration(
                 Q=self.Q,
                 pi=self.pi,
                 MDP=(self.S, self.A, self.T, self.R_sa, self.gamma),
+                eval_method=self.eval_method,
+                V0=V0,
+                eval_sweeps=self.eval_sweeps,
+                eval_stopping=self.eval_stopping,
+                recorder=self.recorder,
+                return_info=True,
             )
 
             self.policy_fitted = True
@@ -141,19 +265,29 @@ class PolicyIteration(AbstractAgent):
 
 def policy_evaluation(
     pi: np.ndarray,
-    T: np.ndarray,
+    T: Transitions,
     R_sa: np.ndarray,
     gamma: float,
     epsilon: float = 1e-8,
-) -> np.ndarray:
+    method: str = "iterative",
+    V0: np.ndarray | None = None,
+    max_sweeps: int | None = None,
+    stopping: str = "max-norm",
+    return_info: bool = False,
+) -> np.ndarray | tuple[np.ndarray, dict[str, Any]]:
     """
     Perform policy evaluation for a fixed policy.
 
+    With ``method="iterative"`` the Bellman expectation backup is repeated until
+    the values change by less than `epsilon`. With ``method="solve"`` the linear
+    system (I - gamma * P_pi) V = r_pi is solved directly, using dense LU for up
+    to ``DENSE_SOLVE_MAX_STATES`` states and a sparse solver above.
+
     Parameters
     ----------
     pi : np.ndarray
         The current policy (array of actions).
-    T : np.ndarray
+    T : np.ndarray or SparseTransitions
         Transition probabilities T[s, a, s'].
     R_sa : np.ndarray
         Reward matrix R[s, a].
@@ -161,31 +295,98 @@ def policy_evaluation(
         Discount factor.
     epsilon : float, optional
         Convergence threshold, by default 1e-8.
+    method : str, optional
+        Either "iterative" or "solve", by default "iterative".
+    V0 : np.ndarray or None, optional
+        Initial values for the iterative method, zeros if None. Ignored by
+        "solve". By default None.
+    max_sweeps : int or None, optional
+        Stop the iterative method after this many backups even if it has not
+        converged. By default None, i.e. no limit.
+    stopping : str, optional
+        Stopping rule of the iterative method. ``"max-norm"`` stops once
+        max|V_new - V| < epsilon. ``"span"`` stops once the span
+        max(V_new - V) - min(V_new - V) drops below epsilon (1 - γ) / (2γ), and
+        shifts V to the midpoint of the resulting bounds on V_pi, which is
+        within epsilon / 2 of it. By default "max-norm".
+    return_info : bool, optional
+        Also return a dict with "sweeps", "stop_reason" and "sweeps_saved",
+        the last as in `value_iteration`. "solve" reports 0 sweeps. By default
+        False.
 
     Returns
     -------
     np.ndarray
         The evaluated value function V[s] for all states.
+    dict
+        Stopping details, only if `return_info`.
+
+    Raises
+    ------
+    ValueError
+        If `method` or `stopping` is unknown, `max_sweeps` is less than 1, or
+        `max_sweeps` is combined with "solve".
     """
     nS = R_sa.shape[0]
-    V = np.zeros(nS)
+    states = np.arange(nS)
+    # Gather the transition rows and rewards of the actions chosen by pi
+    T_pi = policy_transitions(T, pi)
+    r_pi = R_sa[states, pi] * row_sums(T)[states, pi]
+
+    if max_sweeps is not None and max_sweeps < 1:
+        raise ValueError(f"max_sweeps must be at least 1, got {max_sweeps}.")
+    if method == "solve":
+        if max_sweeps is not None:
+            raise ValueError('max_sweeps requires method="iterative".')
+        if nS <= DENSE_SOLVE_MAX_STATES:
+            if sp.issparse(T_pi):
+                T_pi = T_pi.toarray()
+            V = np.linalg.solve(np.eye(nS) - gamma * T_pi, r_pi)
+        else:
+            if not sp.issparse(T_pi):
+                T_pi = sp.csr_matrix(T_pi)  # dense model above the LU threshold
+            # A sparse T already gave a CSR T_pi built from its successor indices
+            A = sp.identity(nS, format="csr") - gamma * T_pi
+            V = spsolve(A, r_pi)
+        if return_info:
+            return V, {"sweeps": 0, "stop_reason": "solve", "sweeps_saved": 0}
+        return V
+    if method != "iterative":
+        raise ValueError(f"Unknown policy evaluation method: {method!r}")
+    if stopping not in ("max-norm", "span"):
+        raise ValueError(f"Unknown stopping rule: {stopping!r}")
+    span_bound = span_threshold(epsilon, gamma)
+
+    V = np.zeros(nS) if V0 is None else V0
+    sweeps = 0
+    stop_reason = "max-sweeps"
 
     while True:
-        V_new = np.zeros(nS)
-        for s in range(nS):
-            a = pi[s]
-            V_new[s] = sum(T[s, a, s_next] * (R_sa[s, a] + gamma * V[s_next])
-                           for s_next in range(nS))
-        if np.max(np.abs(V_new - V)) < epsilon:
+        V_new = r_pi + gamma * (T_pi @ V)
+        sweeps += 1
+        diff = V_new - V
+        delta = np.max(np.abs(diff))
+        if stopping == "span" and np.max(diff) - np.min(diff) < span_bound:
+            stop_reason = "span"
+            V = V_new + span_correction(diff, gamma) if gamma > 0 else V_new
+            break
+        if stopping == "max-norm" and delta < epsilon:
+            stop_reason = "max-norm"
             break
         V = V_new
+        if max_sweeps is not None and sweeps >= max_sweeps:
+            break
 
+    if return_info:
+        # Sweeps are only saved by stopping early, not by the max_sweeps cap
+        saved = sweeps_saved(delta, epsilon, gamma) if stop_reason == "span" else 0
+        return V, {"sweeps": sweeps, "stop_reason": stop_reason, "sweeps_saved": saved}
     return V
 
 
 def policy_improvement(
     V: np.ndarray,
-    T: np.ndarray,
+    T: Transitions,
     R_sa: np.ndarray,
     gamma: float,
 ) -> tuple[np.ndarray, np.ndarray]:
@@ -196,7 +397,7 @@ def policy_improvement(
     ----------
     V : np.ndarray
         Current value function.
-    T : np.ndarray
+    T : np.ndarray or SparseTransitions
         Transition probabilities T[s, a, s'].
     R_sa : np.ndarray
         Reward matrix R[s, a].
@@ -208,12 +409,8 @@ def policy_improvement(
     tuple[np.ndarray, np.ndarray]
         Q-function and the improved policy.
     """
-    nS, nA = R_sa.shape
-    Q = np.zeros((nS, nA))
-    for s in range(nS):
-        for a in range(nA):
-            Q[s, a] = sum(T[s, a, s_next] * (R_sa[s, a] + gamma * V[s_next])
-                          for s_next in range(nS))
+    # Q[s, a] = sum_s' T[s, a, s'] * (R_sa[s, a] + gamma * V[s'])
+    Q = row_sums(T) * R_sa + gamma * expected_values(T, V)
     pi_new = np.argmax(Q, axis=1)
     return Q, pi_new
 
@@ -223,10 +420,25 @@ def policy_iteration(
     pi: np.ndarray,
     MDP: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, float],
     epsilon: float = 1e-8,
-) -> tuple[np.ndarray, np.ndarray, int]:
+    eval_method: str = "iterative",
+    V0: np.ndarray | None = None,
+    eval_sweeps: int | None = None,
+    eval_stopping: str = "max-norm",
+    recorder: SweepRecorder | None = None,
+    return_info: bool = False,
+) -> (
+    tuple[np.ndarray, np.ndarray, int]
+    | tuple[np.ndarray, np.ndarray, int, dict[str, Any]]
+):
     """
     Full policy iteration loop until convergence.
 
+    With `eval_sweeps` set this is modified policy iteration: every policy is
+    only evaluated with that many iterative backups before it is improved, and
+    the loop ends once the policy is stable and the values changed by less than
+    `epsilon`. ``eval_sweeps=1`` performs value iteration, None evaluates every
+    policy to convergence.
+
     Parameters
     ----------
     Q : np.ndarray
@@ -237,23 +449,75 @@ def policy_iteration(
         A tuple (S, A, T, R_sa, gamma) representing the MDP.
     epsilon : float, optional
         Convergence threshold for value updates, by default 1e-8.
+    eval_method : str, optional
+        Method passed to `policy_evaluation`, by default "iterative".
+    V0 : np.ndarray or None, optional
+        Initial values for the first iterative evaluation. Later evaluations
+        start from the values of the previous policy. By default None.
+    eval_sweeps : int or None, optional
+        Evaluation backups per improvement step, by default None (unlimited).
+    eval_stopping : str, optional
+        Stopping rule passed to `policy_evaluation`, by default "max-norm".
+    recorder : SweepRecorder or None, optional
+        Receives time, max value change, number of changed actions and memory
+        of every improvement step, by default None.
+    return_info : bool, optional
+        Also return a dict with the total "eval_sweeps" and "sweeps_saved" of
+        all policy evaluations, see `policy_evaluation`. By default False.
 
     Returns
     -------
     tuple[np.ndarray, np.ndarray, int]
         Final Q-table, final policy, and number of improvement steps.
+    dict
+        Evaluation details, only if `return_info`.
+
+    Raises
+    ------
+    ValueError
+        If `eval_sweeps` is less than 1.
     """
+    if eval_sweeps is not None and eval_sweeps < 1:
+        raise ValueError(f"eval_sweeps must be at least 1, got {eval_sweeps}.")
     S, A, T, R_sa, gamma = MDP
     steps = 0
+    info = {"eval_sweeps": 0, "sweeps_saved": 0}
 
+    V = np.zeros(len(pi)) if V0 is None else V0
+    if recorder is not None:
+        # T, R_sa, Q and two value arrays
+        nbytes = model_nbytes(T, R_sa) + R_sa.nbytes + 2 * V.nbytes
+        recorder.start()
     while True:
-        V = policy_evaluation(pi, T, R_sa, gamma, epsilon)
+        V_prev = V
+        V, eval_info = policy_evaluation(
+            pi,
+            T,
+            R_sa,
+            gamma,
+            epsilon,
+            method=eval_method,
+            V0=V,
+            max_sweeps=eval_sweeps,
+            stopping=eval_stopping,
+            return_info=True,
+        )
+        info["eval_sweeps"] += eval_info["sweeps"]
+        info["sweeps_saved"] += eval_info["sweeps_saved"]
         Q, pi_new = policy_improvement(V, T, R_sa, gamma)
         steps += 1
-        if np.array_equal(pi, pi_new):
+        if recorder is not None:
+            recorder.record(
+                np.max(np.abs(V - V_prev)), np.count_nonzero(pi != pi_new), nbytes
+            )
+        # A partial evaluation may leave V far from V_pi even for a stable policy
+        converged = eval_sweeps is None or np.max(np.abs(V - V_prev)) < epsilon
+        if np.array_equal(pi, pi_new) and converged:
             break
         pi = pi_new
 
+    if return_info:
+        return Q, pi, steps, info
     return Q, pi, steps
 
 
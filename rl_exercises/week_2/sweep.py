@@ -0,0 +1,203 @@
+"""Local process-pool sweeps of the tabular planners over MarsRover configurations.
+
+Every distinct ``env_kwargs`` is turned into a transition model and reward table
+once. The arrays are placed in shared memory, so worker processes map them
+instead of receiving a pickled copy with every task.
+
+Run with ``python -m rl_exercises.week_2.sweep`` for a 1000-point gamma sweep.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import time
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing import shared_memory, util
+
+import numpy as np
+import pandas as pd
+from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import SparseTransitions
+from rl_exercises.week_2.policy_iteration import policy_iteration
+from rl_exercises.week_2.value_iteration import value_iteration
+
+PLANNERS = ("value_iteration", "policy_iteration")
+
+# (shared memory name, shape, dtype) of one array
+ArraySpec = tuple[str, tuple[int, ...], str]
+
+# Shared memory blocks a worker process has attached to, by name
+_attached: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _share(array: np.ndarray, blocks: list[shared_memory.SharedMemory]) -> ArraySpec:
+    """Copy an array into a new shared memory block and describe it."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def _close_attached() -> None:
+    """Close the shared memory blocks this worker process attached to."""
+    while _attached:
+        _attached.popitem()[1].close()
+
+
+def _init_worker() -> None:
+    """Close the attached blocks when the worker process exits."""
+    util.Finalize(None, _close_attached, exitpriority=0)
+
+
+def _attach(spec: ArraySpec) -> np.ndarray:
+    """Read-only view of an array shared with `_share`."""
+    name, shape, dtype = spec
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf)
+    array.flags.writeable = False
+    return array
+
+
+def solve(
+    specs: tuple[ArraySpec, ArraySpec, ArraySpec],
+    planner: str,
+    gamma: float,
+    epsilon: float,
+) -> dict[str, Any]:
+    """
+    Solve one MDP from shared memory, runs in a worker process.
+
+    Parameters
+    ----------
+    specs : tuple
+        Shared next states, probabilities and R_sa of the MDP.
+    planner : str
+        "value_iteration" or "policy_iteration".
+    gamma : float
+        Discount factor.
+    epsilon : float
+        Convergence threshold.
+
+    Returns
+    -------
+    dict[str, Any]
+        Result columns of the sweep table for this configuration.
+    """
+    next_states, probs, R_sa = (_attach(spec) for spec in specs)
+    T = SparseTransitions(next_states, probs)
+    start = time.perf_counter()
+    if planner == "value_iteration":
+        V, pi = value_iteration(T=T, R_sa=R_sa, gamma=gamma, epsilon=epsilon)
+        steps = -1
+    else:
+        n_states, n_actions = R_sa.shape
+        Q, pi, steps = policy_iteration(
+            np.zeros((n_states, n_actions)),
+            np.zeros(n_states, dtype=int),
+            (np.arange(n_states), np.arange(n_actions), T, R_sa, gamma),
+            epsilon,
+        )
+        V = Q[np.arange(n_states), pi]
+    return {
+        "seconds": time.perf_counter() - start,
+        "steps": steps,
+        "value_mean": float(np.mean(V)),
+        "value_max": float(np.max(V)),
+        "policy": np.asarray(pi, dtype=np.int64),
+    }
+
+
+def sweep(
+    gammas: Iterable[float],
+    epsilons: Iterable[float] = (1e-8,),
+    env_kwargs: Sequence[dict] = ({},),
+    planner: str = "value_iteration",
+    max_workers: int | None = None,
+    chunksize: int = 16,
+    path: str | None = None,
+) -> pd.DataFrame:
+    """
+    Solve every (gamma, epsilon, env_kwargs) combination in a process pool.
+
+    Parameters
+    ----------
+    gammas : Iterable[float]
+        Discount factors.
+    epsilons : Iterable[float], optional
+        Convergence thresholds, by default (1e-8,).
+    env_kwargs : Sequence[dict], optional
+        MarsRover configurations, by default the default MarsRover.
+    planner : str, optional
+        "value_iteration" or "policy_iteration", by default "value_iteration".
+    max_workers : int or None, optional
+        Number of worker processes, by default one per CPU.
+    chunksize : int, optional
+        Configurations sent to a worker at once, by default 16.
+    path : str or None, optional
+        Also write the table to this CSV file if given, by default None.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per configuration with the columns env (index into
+        `env_kwargs`), gamma, epsilon, planner, seconds, steps (-1 for value
+        iteration), value_mean, value_max and policy (int array with one action
+        per state). The CSV file stores the policy as space-separated actions.
+
+    Raises
+    ------
+    ValueError
+        If the planner is unknown.
+    """
+    if planner not in PLANNERS:
+        raise ValueError(f"Unknown planner {planner!r}, expected one of {PLANNERS}")
+
+    blocks: list[shared_memory.SharedMemory] = []
+    try:
+        specs = []
+        for kwargs in env_kwargs:
+            env = MarsRover(**kwargs)
+            T = env.get_transition_matrix(sparse=True)
+            R_sa = env.get_reward_per_action()
+            specs.append(
+                tuple(_share(array, blocks) for array in (T.next_states, T.probs, R_sa))
+            )
+
+        configs = list(product(range(len(specs)), gammas, epsilons))
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker
+        ) as executor:
+            results = list(
+                executor.map(
+                    solve,
+                    [specs[env] for env, _, _ in configs],
+                    [planner] * len(configs),
+                    [gamma for _, gamma, _ in configs],
+                    [epsilon for _, _, epsilon in configs],
+                    chunksize=chunksize,
+                )
+            )
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    table = pd.DataFrame(configs, columns=["env", "gamma", "epsilon"])
+    table["planner"] = planner
+    table = pd.concat([table, pd.DataFrame(results)], axis=1)
+    if path is not None:
+        policies = table.policy.map(lambda pi: " ".join(map(str, pi)))
+        table.assign(policy=policies).to_csv(path, index=False)
+    return table
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    table = sweep(np.linspace(0.0, 0.999, 1_000), path="gamma_sweep.csv")
+    policies = table.policy.map(lambda pi: "".join(map(str, pi)))
+    print(table.groupby(policies)["gamma"].agg(["min", "max", "count"]))
+    print(f"Solved {len(table)} configurations in {time.perf_counter() - start:.2f}s")
@@ -1,11 +1,30 @@
 from __future__ import annotations
 
-from typing import Any, Tuple
+from typing import Any
+
+import heapq
+import warnings
 
 import gymnasium
 import numpy as np
+import scipy.sparse as sp
 from rl_exercises.agent import AbstractAgent
 from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import (
+    SPARSE_MIN_STATES,
+    SweepRecorder,
+    TabularMDP,
+    Transitions,
+    expected_values,
+    model_nbytes,
+    predecessors,
+    span_correction,
+    span_threshold,
+    sweeps_saved,
+)
+
+VALUE_ITERATION_MODES = ("jacobi", "gauss-seidel", "prioritized")
+STOPPING_RULES = ("max-norm", "span", "action-gap")
 
 
 class ValueIteration(AbstractAgent):
@@ -20,6 +39,28 @@ class ValueIteration(AbstractAgent):
         Discount factor for future rewards.
     seed : int, default=333
         Random seed for tie‐breaking among equally‐good actions.
+    mode : str, default="jacobi"
+        Backup schedule passed to :func:`value_iteration`, one of
+        ``"jacobi"``, ``"gauss-seidel"`` or ``"prioritized"``.
+    sparse : bool or None, default=None
+        Whether to request the sparse transition format from the environment.
+        If None, it is used above ``SPARSE_MIN_STATES`` states.
+    filename : str, default="value_iteration.npz"
+        Path to save/load V and the policy.
+    initial_values : np.ndarray or None, default=None
+        Value function to start value iteration from. Zeros if None.
+    stopping : str, default="max-norm"
+        Stopping rule passed to :func:`value_iteration`, one of
+        ``"max-norm"``, ``"span"`` or ``"action-gap"``.
+    policy_stable_sweeps : int or None, default=None
+        Stop once the greedy policy has been stable for this many sweeps, see
+        :func:`value_iteration`.
+    mdp : TabularMDP or None, default=None
+        MDP to plan on, e.g. shared with another agent. Its discount factor
+        replaces `gamma`. If None, it is extracted from `env` on the first
+        update.
+    recorder : SweepRecorder or None, default=None
+        Receives per-sweep statistics of every value iteration run.
 
     Attributes
     ----------
@@ -29,13 +70,29 @@ class ValueIteration(AbstractAgent):
         The greedy policy derived from V.
     policy_fitted : bool
         Whether value iteration has been run yet.
+    steps : int
+        Number of sweeps of the last value iteration run, or of single-state
+        backups in ``"prioritized"`` mode.
+    info : dict
+        Stopping details of the last run: "iterations", "stop_reason" and the
+        estimated "sweeps_saved" compared to the ``"max-norm"`` rule.
     """
 
+    policy_arrays = ("pi",)
+
     def __init__(
         self,
         env: MarsRover | gymnasium.Env,
         gamma: float = 0.9,
         seed: int = 333,
+        mode: str = "jacobi",
+        sparse: bool | None = None,
+        filename: str = "value_iteration.npz",
+        initial_values: np.ndarray | None = None,
+        stopping: str = "max-norm",
+        policy_stable_sweeps: int | None = None,
+        mdp: TabularMDP | None = None,
+        recorder: SweepRecorder | None = None,
         **kwargs: dict,
     ) -> None:
         if hasattr(env, "unwrapped"):
@@ -43,8 +100,14 @@ class ValueIteration(AbstractAgent):
         super().__init__(**kwargs)
 
         self.env = env
-        self.gamma = gamma
+        self.mdp = mdp
+        self.gamma = gamma if mdp is None else mdp.gamma
         self.seed = seed
+        self.mode = mode
+        self.stopping = stopping
+        self.policy_stable_sweeps = policy_stable_sweeps
+        self.recorder = recorder
+        self.filename = filename
 
         # TODO: Extract MDP components from the environment
         self.S = None
@@ -56,31 +119,80 @@ class ValueIteration(AbstractAgent):
 
         self.n_obs = self.env.observation_space.n  # Number of observations/states
         self.n_actions = self.env.action_space.n  # Number of actions
+        self.n_states = self.n_obs
+        if sparse is None:
+            sparse = self.n_states > SPARSE_MIN_STATES
+        self.sparse = sparse
 
-        # placeholders
-        self.V = np.zeros(self.n_states, dtype=float)
+        # placeholders, value iteration starts from the current V
+        if initial_values is None:
+            self.V = np.zeros(self.n_states, dtype=float)
+        else:
+            self.V = np.array(initial_values, dtype=float)
         self.pi = np.zeros(self.n_states, dtype=int)
         self.policy_fitted = False
+        self.steps = 0
+        self.info: dict[str, Any] = {}
 
-    def update_agent(self, *args: tuple, **kwargs: dict) -> None:
-        """Run value iteration to compute the optimal policy and state-action values."""
-        if not self.policy_fitted:
+    def update_agent(self, *args: tuple, refit: bool = False, **kwargs: dict) -> None:
+        """Run value iteration to compute the optimal policy and state-action values.
+
+        Value iteration starts from the current V, e.g. a loaded one. Pass
+        ``refit=True`` to extract the MDP from the environment again and solve
+        it after the environment changed.
+        """
+        if not self.policy_fitted or refit:
             # Initialize MDP components
-            self.S = np.arange(self.n_obs)
-            self.A = np.arange(self.n_actions)
-            self.T = self.env.get_transition_matrix()
-            self.R_sa = self.env.get_reward_per_action()
+            if self.mdp is None or refit:
+                self.mdp = TabularMDP.from_env(self.env, self.gamma, self.sparse)
+            self.S, self.A = self.mdp.states, self.mdp.actions
+            self.T, self.R_sa = self.mdp.T, self.mdp.R_sa
 
             # Run value iteration
-            self.V, self.pi = value_iteration(
+            self.V, self.pi, self.info = value_iteration(
                 T=self.T,
                 R_sa=self.R_sa,
                 gamma=self.gamma,
                 seed=self.seed,
+                mode=self.mode,
+                V0=self.V,
+                pred=self.mdp.predecessors if self.mode == "prioritized" else None,
+                stopping=self.stopping,
+                policy_stable_sweeps=self.policy_stable_sweeps,
+                return_info=True,
+                recorder=self.recorder,
             )
+            self.steps = self.info["iterations"]
 
             self.policy_fitted = True
 
+    def save(self, *args: tuple[Any], **kwargs: dict) -> None:
+        """Save V and the policy to a `.npz` file.
+
+        Raises
+        ------
+        Warning
+            If the policy has not yet been fitted.
+        """
+        if self.policy_fitted:
+            np.savez(self.filename, V=self.V, pi=self.pi)
+        else:
+            warnings.warn("Tried to save policy but policy is not fitted yet.")
+
+    def load(self, *args: tuple[Any], **kwargs: dict) -> np.ndarray:
+        """Load V and the policy from file.
+
+        Returns
+        -------
+        np.ndarray
+            The loaded policy array.
+        """
+        with np.load(self.filename) as data:
+            self.V = data["V"]
+            self.pi = data["pi"]
+        self.policy_fitted = True
+        return self.pi
+
     def predict_action(
         self,
         observation: int,
@@ -95,15 +207,34 @@ class ValueIteration(AbstractAgent):
         action = self.pi[observation]
         return action, {}
 
+    def predict_actions(
+        self,
+        observations: np.ndarray,
+        infos: dict | None = None,
+        evaluate: bool = False,
+    ) -> tuple[np.ndarray, dict]:
+        """Choose actions = π(observations) with one lookup. Runs update if needed."""
+        if not self.policy_fitted:
+            self.update_agent()
+
+        return self.pi[np.asarray(observations)], {}
+
 
 def value_iteration(
     *,
-    T: np.ndarray,
+    T: Transitions,
     R_sa: np.ndarray,
     gamma: float,
     seed: int | None = None,
     epsilon: float = 1e-8,
-) -> Tuple[np.ndarray, np.ndarray]:
+    mode: str = "jacobi",
+    V0: np.ndarray | None = None,
+    pred: sp.csr_matrix | None = None,
+    stopping: str = "max-norm",
+    policy_stable_sweeps: int | None = None,
+    return_info: bool = False,
+    recorder: SweepRecorder | None = None,
+) -> tuple[np.ndarray, np.ndarray] | tuple[np.ndarray, np.ndarray, dict[str, Any]]:
     """Run Value Iteration on a finite MDP.
 
     Solves for
@@ -113,7 +244,7 @@ def value_iteration(
 
     Parameters
     ----------
-    T : np.ndarray, shape (n_states, n_actions, n_states)
+    T : np.ndarray or SparseTransitions, shape (n_states, n_actions, n_states)
         Transition probabilities.
     R_sa : np.ndarray, shape (n_states, n_actions)
         Rewards for each (state, action).
@@ -122,32 +253,362 @@ def value_iteration(
     seed : int or None
         RNG seed for tie‐breaking among equal actions.
     epsilon : float
-        Stopping threshold on max value‐update difference.
+        Stopping threshold on max value‐update difference, or the tolerance
+        of the span bound.
+    mode : str, default="jacobi"
+        Backup schedule. ``"jacobi"`` updates all states at once from the
+        previous sweep's values, ``"gauss-seidel"`` updates states in place
+        so later states already see the new values of earlier ones.
+        ``"prioritized"`` backs up one state at a time, always the one with the
+        largest Bellman residual, see :func:`prioritized_sweeping`.
+    V0 : np.ndarray or None, shape (n_states,)
+        Initial value function, e.g. the solution of a similar MDP. Zeros if
+        None. It is not modified.
+    pred : scipy.sparse.csr_matrix or None
+        Predecessor index of T for ``"prioritized"``, e.g.
+        ``TabularMDP.predecessors``. Built from T if None.
+    stopping : str, default="max-norm"
+        When to stop ``"jacobi"`` sweeps:
+
+        - ``"max-norm"``: once max|V_new - V| < epsilon.
+        - ``"span"``: once the span max(V_new - V) - min(V_new - V) drops
+          below epsilon (1 - γ) / (2γ). The greedy policy is then
+          epsilon-optimal, and V is shifted to the midpoint of the bounds on V*.
+          The returned policy is greedy w.r.t. the shifted V.
+        - ``"action-gap"``: once the greedy policy is provably optimal. This
+          holds when, in every state, the best action beats the runner-up by
+          more than 2γ max|V_new - V| / (1 - γ), the largest possible error of
+          Q. It is checked before ``"max-norm"``, which remains the fallback
+          for MDPs with tied actions.
+    policy_stable_sweeps : int or None, default=None
+        Also stop ``"jacobi"`` sweeps once the greedy policy has not changed
+        for this many sweeps. A heuristic, without an optimality guarantee,
+        checked only if `stopping` does not stop the sweep.
+    return_info : bool, default=False
+        Also return a dict with "iterations", "stop_reason" and
+        "sweeps_saved". "iterations" is the number of sweeps, or of
+        single-state backups in ``"prioritized"`` mode. "sweeps_saved" is the
+        number of further sweeps the ``"max-norm"`` rule would need, estimated
+        from the γ-contraction of the last update. It is negative if that rule
+        would have stopped earlier.
+    recorder : SweepRecorder or None, default=None
+        Receives time, max value change, greedy policy changes and memory of
+        every sweep. The first sweep records -1 policy changes. In
+        ``"prioritized"`` mode, every n_states backups, and a partial last
+        batch, count as one sweep, with the largest remaining residual and no
+        policy changes.
 
     Returns
     -------
     V : np.ndarray, shape (n_states,)
-        Optimal state‐value function.
+        Optimal state‐value function. It is only converged to `epsilon`
+        under the ``"max-norm"`` rule.
     pi : np.ndarray, shape (n_states,)
         Greedy policy w.r.t. V, with random tie‐breaking.
+    info : dict
+        Stopping details, only if `return_info`.
+
+    Raises
+    ------
+    ValueError
+        If `mode` or `stopping` is unknown, or early stopping is requested for
+        a mode other than ``"jacobi"``.
     """
-    n_states, n_actions = R_sa.shape
-    V = np.zeros(n_states, dtype=float)
-    rng = np.random.default_rng(seed)
-    pi = np.zeros(n_states, dtype=int)
-
-    while True:
-        delta = 0
-        for s in range(n_states):
-            q_values = np.zeros(n_actions)
-            for a in range(n_actions):
-                q_values[a] = R_sa[s, a] + gamma * np.sum(T[s, a, :] * V)
-            max_q = np.max(q_values)
-            delta = max(delta, abs(max_q - V[s]))
-            V[s] = max_q
-            pi[s] = rng.choice(np.flatnonzero(q_values == max_q))
-
-        if delta < epsilon:
-            break
+    if mode not in VALUE_ITERATION_MODES:
+        raise ValueError(
+            f"Unknown mode {mode!r}, expected one of {VALUE_ITERATION_MODES}"
+        )
+    if stopping not in STOPPING_RULES:
+        raise ValueError(
+            f"Unknown stopping rule {stopping!r}, expected one of {STOPPING_RULES}"
+        )
+    if mode != "jacobi" and (stopping != "max-norm" or policy_stable_sweeps):
+        raise ValueError(f'Early stopping requires mode="jacobi", got {mode!r}.')
+
+    n_states = R_sa.shape[0]
+    if V0 is None:
+        V = np.zeros(n_states, dtype=float)
+    else:
+        V = np.array(V0, dtype=float)
+    iterations = 0
+    stop_reason = "max-norm"
+    Q = None
+    # T, R_sa, Q and two value arrays
+    nbytes = model_nbytes(T, R_sa) + R_sa.nbytes + 2 * V.nbytes
+    if recorder is not None:
+        recorder.start()
+
+    if mode == "prioritized":
+        V, iterations = prioritized_sweeping(T, R_sa, gamma, V, epsilon, pred, recorder)
+    elif mode == "jacobi":
+        span_bound = span_threshold(epsilon, gamma)
+        track_policy = recorder is not None or policy_stable_sweeps
+        states = np.arange(n_states)
+        stable = 0
+        pi_prev = None
+        while True:
+            Q_V = R_sa + gamma * expected_values(T, V)
+            if track_policy:
+                # one pass over Q_V gives both the greedy actions and V
+                pi_greedy = np.argmax(Q_V, axis=1)
+                V_new = Q_V[states, pi_greedy]
+            else:
+                V_new = np.max(Q_V, axis=1)
+            diff = V_new - V
+            delta = np.max(np.abs(diff))
+            iterations += 1
+            if track_policy:
+                # The first greedy policy has nothing to be compared to
+                changes = (
+                    -1
+                    if pi_prev is None
+                    else int(np.count_nonzero(pi_greedy != pi_prev))
+                )
 
+            # The selected rule is checked first, then max-norm unless it is
+            # "span", then policy stability
+            stop_reason = None
+            if stopping == "span" and np.max(diff) - np.min(diff) < span_bound:
+                stop_reason = "span"
+                if gamma > 0:
+                    # A constant shift leaves the greedy actions unchanged, the
+                    # final Q below is computed from the shifted values
+                    V_new = V_new + span_correction(diff, gamma)
+            elif (
+                stopping == "action-gap"
+                and gamma > 0
+                and np.min(action_gaps(Q_V)) > 2 * gamma * delta / (1 - gamma)
+            ):
+                # The greedy policy of Q_V is optimal, and V_new is its maximum
+                stop_reason, Q = "action-gap", Q_V
+            elif stopping != "span" and delta < epsilon:
+                stop_reason = "max-norm"
+            if stop_reason is None and policy_stable_sweeps:
+                stable = stable + 1 if changes == 0 else 0
+                if stable >= policy_stable_sweeps:
+                    stop_reason = "policy-stable"
+            if track_policy:
+                pi_prev = pi_greedy
+            if recorder is not None:
+                recorder.record(delta, changes, nbytes)
+
+            V = V_new
+            if stop_reason is not None:
+                break
+    else:
+        pi_greedy = np.zeros(n_states, dtype=int)
+        while True:
+            iterations += 1
+            delta = 0.0
+            changes = 0
+            for s in range(n_states):
+                q = R_sa[s] + gamma * expected_values(T, V, s)
+                max_q = np.max(q)
+                delta = max(delta, abs(max_q - V[s]))
+                V[s] = max_q
+                if recorder is not None:
+                    a = np.argmax(q)
+                    changes += int(a != pi_greedy[s])
+                    pi_greedy[s] = a
+            if recorder is not None:
+                # as in "jacobi", the first sweep has no previous policy
+                recorder.record(delta, changes if iterations > 1 else -1, nbytes)
+            if delta < epsilon:
+                break
+
+    if Q is None:
+        Q = R_sa + gamma * expected_values(T, V)
+    pi = greedy_policy(Q, seed=seed)
+    if return_info:
+        info = {
+            "iterations": iterations,
+            "stop_reason": stop_reason,
+            "sweeps_saved": 0
+            if stop_reason == "max-norm"
+            else sweeps_saved(delta, epsilon, gamma),
+        }
+        return V, pi, info
     return V, pi
+
+
+def prioritized_sweeping(
+    T: Transitions,
+    R_sa: np.ndarray,
+    gamma: float,
+    V: np.ndarray,
+    epsilon: float = 1e-8,
+    pred: sp.csr_matrix | None = None,
+    recorder: SweepRecorder | None = None,
+) -> tuple[np.ndarray, int]:
+    """Asynchronous value iteration ordered by Bellman residuals.
+
+    A max-heap holds every state whose residual
+    ``|max_a [R_sa[s,a] + γ ∑_{s'} T[s,a,s'] V(s')] - V(s)|`` is at least
+    `epsilon`. The state with the largest residual is backed up first. Only the
+    residuals of its predecessors can change, so they are recomputed and pushed
+    again. States whose values have settled are never touched. Stops when no
+    residual is above `epsilon`, the same criterion as the other modes.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions, shape (n_states, n_actions, n_states)
+        Transition probabilities.
+    R_sa : np.ndarray, shape (n_states, n_actions)
+        Rewards for each (state, action).
+    gamma : float
+        Discount factor (0 ≤ γ < 1).
+    V : np.ndarray, shape (n_states,)
+        Initial value function, updated in place.
+    epsilon : float
+        Residual threshold.
+    pred : scipy.sparse.csr_matrix or None
+        Predecessor index of T, see :func:`rl_exercises.mdp.predecessors`.
+        Built from T if None.
+    recorder : SweepRecorder or None
+        Receives one record per n_states backups and one for a partial last
+        batch, see :func:`value_iteration`.
+
+    Returns
+    -------
+    V : np.ndarray, shape (n_states,)
+        Optimal state‐value function.
+    backups : int
+        Number of single-state backups.
+    """
+    if pred is None:
+        pred = predecessors(T)
+    n_states = len(V)
+    # T, R_sa, V, the residuals and the predecessor index
+    nbytes = model_nbytes(T, R_sa, pred) + 2 * V.nbytes
+
+    def residuals(states: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        V_new = np.max(R_sa[states] + gamma * expected_values(T, V, states), axis=1)
+        return V_new, np.abs(V_new - V[states])
+
+    _, priority = residuals(np.arange(len(V)))
+    heap = [(-p, s) for s, p in enumerate(priority) if p >= epsilon]
+    heapq.heapify(heap)
+    backups = 0
+
+    while heap:
+        neg_p, s = heapq.heappop(heap)
+        if -neg_p != priority[s]:
+            continue  # stale entry, the state was re-pushed with a new residual
+        V_new, _ = residuals(np.array([s]))
+        V[s] = V_new[0]
+        priority[s] = 0.0
+        backups += 1
+
+        preds = pred.indices[pred.indptr[s] : pred.indptr[s + 1]]
+        _, res = residuals(preds)
+        for p, r in zip(preds, res):
+            if r != priority[p]:
+                priority[p] = r
+                if r >= epsilon:
+                    heapq.heappush(heap, (-r, p))
+
+        if recorder is not None and backups % n_states == 0:
+            recorder.record(float(np.max(priority)), -1, nbytes)
+
+    # A partial last sweep, which the check above misses after stale pops
+    if recorder is not None and (backups % n_states or not backups):
+        recorder.record(float(np.max(priority)), -1, nbytes)
+    return V, backups
+
+
+def value_iteration_batched(
+    *,
+    T: Transitions,
+    R_sa: np.ndarray,
+    gammas: np.ndarray,
+    seed: int | None = None,
+    epsilon: float = 1e-8,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run Jacobi Value Iteration for several discount factors at once.
+
+    All K value functions are backed up together with one batched Bellman
+    update per sweep. A discount factor drops out of the batch as soon as its
+    own update falls below `epsilon`, so every row equals the result of
+    :func:`value_iteration` with that gamma.
+
+    Parameters
+    ----------
+    T : np.ndarray or SparseTransitions, shape (n_states, n_actions, n_states)
+        Transition probabilities.
+    R_sa : np.ndarray, shape (n_states, n_actions)
+        Rewards for each (state, action).
+    gammas : np.ndarray, shape (K,)
+        Discount factors (0 ≤ γ < 1).
+    seed : int or None
+        RNG seed for tie‐breaking among equal actions.
+    epsilon : float
+        Stopping threshold on max value‐update difference.
+
+    Returns
+    -------
+    V : np.ndarray, shape (K, n_states)
+        Optimal state‐value function for every gamma.
+    pi : np.ndarray, shape (K, n_states)
+        Greedy policy w.r.t. each V, with random tie‐breaking.
+    iterations : np.ndarray, shape (K,)
+        Number of sweeps until each gamma converged.
+    """
+    gammas = np.asarray(gammas, dtype=float)
+    n_states = R_sa.shape[0]
+    V = np.zeros((len(gammas), n_states), dtype=float)
+    iterations = np.zeros(len(gammas), dtype=int)
+    active = np.arange(len(gammas))
+
+    while len(active):
+        V_new = np.max(
+            R_sa + gammas[active, None, None] * expected_values(T, V[active]), axis=-1
+        )
+        delta = np.max(np.abs(V_new - V[active]), axis=1)
+        V[active] = V_new
+        iterations[active] += 1
+        active = active[delta >= epsilon]
+
+    Q = R_sa + gammas[:, None, None] * expected_values(T, V)
+    pi = np.stack([greedy_policy(Q_k, seed=seed) for Q_k in Q])
+    return V, pi, iterations
+
+
+def action_gaps(Q: np.ndarray) -> np.ndarray:
+    """Difference between the best and the second best action value per state.
+
+    Parameters
+    ----------
+    Q : np.ndarray, shape (n_states, n_actions)
+        State-action values.
+
+    Returns
+    -------
+    np.ndarray, shape (n_states,)
+        Action gaps, infinite if there is only one action.
+    """
+    if Q.shape[1] < 2:
+        return np.full(Q.shape[0], np.inf)
+    top_two = np.partition(Q, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def greedy_policy(Q: np.ndarray, seed: int | None = None) -> np.ndarray:
+    """Extract the greedy policy from Q with uniform random tie-breaking.
+
+    Parameters
+    ----------
+    Q : np.ndarray, shape (n_states, n_actions)
+        State-action values.
+    seed : int or None
+        RNG seed for tie‐breaking among equal actions.
+
+    Returns
+    -------
+    pi : np.ndarray, shape (n_states,)
+        For every state, one of the maximizing actions drawn uniformly.
+    """
+    rng = np.random.default_rng(seed)
+    is_max = Q == np.max(Q, axis=1, keepdims=True)
+    # A random key per (s, a); the largest key among the maximizers wins
+    keys = np.where(is_max, rng.random(Q.shape), -1.0)
+    return np.argmax(keys, axis=1)
@@ -0,0 +1,206 @@
+import tempfile
+import unittest
+
+import numpy as np
+from rl_exercises.agent.buffer import (
+    MemmapBuffer,
+    NStepBuffer,
+    PrioritizedBuffer,
+    ReplayBuffer,
+    SimpleBuffer,
+    SumTree,
+)
+
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_ring_overwrites_oldest(self):
+        buffer = ReplayBuffer(capacity=3, seed=0)
+        self.assertEqual(len(buffer), 0)
+        for i in range(5):
+            buffer.add(np.full(2, i), i % 2, float(i), np.full(2, i + 1), i == 4, {})
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.position, 2)
+        # slots 0 and 1 were overwritten by transitions 3 and 4
+        np.testing.assert_array_equal(buffer.data["rewards"], [3.0, 4.0, 2.0])
+        np.testing.assert_array_equal(buffer.data["dones"], [False, True, False])
+
+    def test_sample_returns_typed_columns(self):
+        buffer = ReplayBuffer(capacity=10, seed=0)
+        with self.assertRaises(ValueError):
+            buffer.sample(4)
+        for i in range(6):
+            obs = np.full(3, i, dtype=np.float32)
+            buffer.add(obs, i, float(i), obs + 1, False, {"ignored": i})
+
+        states, actions, rewards, next_states, dones = buffer.sample(batch_size=8)
+        self.assertEqual(states.shape, (8, 3))
+        self.assertEqual(states.dtype, np.float32)
+        self.assertEqual(actions.shape, (8,))
+        self.assertEqual(dones.dtype, np.bool_)
+        # rows stay aligned across columns
+        np.testing.assert_array_equal(states[:, 0], actions)
+        np.testing.assert_array_equal(next_states[:, 0], rewards + 1)
+
+    def test_schema_casts_observations_and_keeps_info_keys(self):
+        buffer = ReplayBuffer(
+            capacity=4, obs_shape=(2, 2), obs_dtype="uint8", info_keys=["lives"]
+        )
+        for i in range(3):
+            obs = np.full((2, 2), i, dtype=np.float64)
+            info = {"lives": 3 - i, "frame": obs} if i else {"lives": 3}
+            buffer.add(obs, 0, 1.0, obs, False, info)
+            obs[:] = -1  # the buffer holds a copy, not the caller's array
+        self.assertEqual(buffer.data["states"].dtype, np.uint8)
+        self.assertEqual(set(buffer.data), set(buffer.columns))
+        np.testing.assert_array_equal(buffer.data["states"][:3, 0, 0], [0, 1, 2])
+        np.testing.assert_array_equal(buffer.data["info_lives"][:3], [3, 2, 1])
+        self.assertEqual(len(buffer.sample(2)), 6)
+
+        # info columns are float64, missing entries NaN, non-scalars rejected
+        buffer.add(obs, 0, 1.0, obs, False, {"lives": 0.5})
+        buffer.add(obs, 0, 1.0, obs, False, {})
+        self.assertEqual(buffer.data["info_lives"].dtype, np.float64)
+        np.testing.assert_array_equal(buffer.data["info_lives"][[3, 0]], [0.5, np.nan])
+        for value in [{"r": 1.0}, np.zeros(2), "x"]:
+            with self.assertRaises(ValueError):
+                buffer.add(obs, 0, 1.0, obs, False, {"lives": value})
+
+        simple = SimpleBuffer(info_keys=["lives"])
+        simple.add(0, 0, 0.0, 1, False, {"lives": 1, "frame": np.zeros(4)})
+        self.assertEqual(simple.sample()[0][-1], {"lives": 1})
+
+
+class TestPrioritizedBuffer(unittest.TestCase):
+    def test_sum_tree(self):
+        tree = SumTree(5)
+        tree.update(np.arange(5), np.array([1.0, 2.0, 3.0, 4.0, 0.0]))
+        self.assertEqual(tree.total, 10.0)
+        np.testing.assert_array_equal(
+            tree.find(np.array([0.0, 0.99, 1.0, 2.5, 5.9, 6.0, 9.99])),
+            [0, 0, 1, 1, 2, 3, 3],
+        )
+        tree.update(np.array([3, 4]), np.array([0.0, 5.0]))
+        self.assertEqual(tree.total, 11.0)
+        np.testing.assert_array_equal(tree[np.array([3, 4])], [0.0, 5.0])
+
+    def test_find_skips_empty_leaves(self):
+        tree = SumTree(1000)
+        tree.update(np.arange(3), np.array([0.1, 0.2, 0.3]))
+        # total itself is clamped, it used to land on the empty last leaf
+        self.assertEqual(tree.find(np.array([tree.total]))[0], 2)
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            leaves = tree.find(rng.random(1000) * tree.total)
+            self.assertTrue(np.all(tree[leaves] > 0))
+
+        buffer = PrioritizedBuffer(capacity=1000, alpha=0.6, seed=0)
+        for i in range(7):
+            buffer.add(np.array([i]), 0, 0.0, np.array([i]), False, {})
+        buffer.update_priorities(np.arange(7), rng.random(7) * 1e-3)
+        for _ in range(200):
+            *_, weights, indices = buffer.sample(64)
+            self.assertTrue(np.all(indices < 7))
+            self.assertTrue(np.all(np.isfinite(weights)))
+
+    def test_sampling_follows_priorities(self):
+        buffer = PrioritizedBuffer(capacity=4, alpha=1.0, beta=1.0, seed=0)
+        for i in range(4):
+            buffer.add(np.array([i]), 0, 0.0, np.array([i]), False, {})
+        buffer.update_priorities(np.arange(4), np.array([1.0, 0.0, 0.0, 3.0]))
+
+        *columns, weights, indices = buffer.sample(batch_size=4000)
+        self.assertEqual(len(columns), 5)
+        np.testing.assert_array_equal(columns[0][:, 0], indices)
+        counts = np.bincount(indices, minlength=4) / len(indices)
+        np.testing.assert_allclose(counts, [0.25, 0.0, 0.0, 0.75], atol=0.03)
+        # rarer transitions get the larger importance weight
+        self.assertEqual(weights.max(), 1.0)
+        self.assertGreater(weights[indices == 0][0], weights[indices == 3][0])
+
+
+class TestMemmapBuffer(unittest.TestCase):
+    def test_grow_and_reopen(self):
+        with tempfile.TemporaryDirectory() as path:
+            buffer = MemmapBuffer(
+                path=path, capacity=2, flush_every=100, info_keys=["k"], seed=0
+            )
+            for i in range(5):
+                buffer.add(np.full(2, i, dtype=np.float32), i, i, np.full(2, i), 0, {})
+            # append-only: the files grew instead of overwriting
+            self.assertEqual(len(buffer), 5)
+            self.assertEqual(buffer.capacity, 8)
+            buffer.flush()
+
+            reopened = MemmapBuffer(path=path, seed=0)
+            self.assertEqual(reopened.columns, buffer.columns)
+            self.assertEqual(len(reopened), 5)
+            reopened.add(np.full(2, 5, dtype=np.float32), 5, 5.0, np.full(2, 5), 1, {})
+            np.testing.assert_array_equal(reopened.data["rewards"][:6], np.arange(6))
+
+            states, actions, rewards, _, _, _ = reopened.sample(batch_size=16)
+            self.assertIsInstance(states, np.ndarray)
+            self.assertNotIsInstance(states, np.memmap)
+            np.testing.assert_array_equal(states[:, 0], actions)
+            np.testing.assert_array_equal(rewards, actions)
+            self.assertFalse(np.all(np.diff(actions) >= 0))
+
+            with self.assertRaises(ValueError):
+                MemmapBuffer(path=path, obs_shape=(3,))
+            with self.assertRaises(ValueError):
+                MemmapBuffer(path=path, obs_dtype="uint8")
+            with self.assertRaises(ValueError):
+                MemmapBuffer(path=path, info_keys=["other"])
+
+    def test_size_survives_without_flush(self):
+        with tempfile.TemporaryDirectory() as path:
+            buffer = MemmapBuffer(path=path, capacity=4, flush_every=100)
+            for i in range(3):
+                buffer.add(np.full(2, i), i, i, np.full(2, i), 0, {})
+            # no flush: the counter file still records the written rows
+            reopened = MemmapBuffer(path=path)
+            self.assertEqual(len(reopened), 3)
+            np.testing.assert_array_equal(reopened.data["rewards"][:3], np.arange(3))
+
+
+class TestNStepBuffer(unittest.TestCase):
+    def test_discounted_returns_per_env(self):
+        buffer = NStepBuffer(n_steps=3, gamma=0.5, capacity=10)
+        rewards = [1.0, 2.0, 4.0, 8.0]
+        for t, r in enumerate(rewards):
+            buffer.add(t, 0, r, t + 1, t == 3, {}, env_id=0)
+            # a second environment interleaves without mixing its transitions in
+            buffer.add(100 + t, 1, 100.0, 101 + t, False, {}, env_id=1)
+        # env 0: two full windows, then the episode end flushes the remaining two
+        inner = buffer.buffer.data
+        mask = inner["actions"][: len(buffer)] == 0
+        np.testing.assert_array_equal(
+            inner["states"][: len(buffer)][mask], [0, 1, 2, 3]
+        )
+        np.testing.assert_array_equal(
+            inner["next_states"][: len(buffer)][mask], [3, 4, 4, 4]
+        )
+        np.testing.assert_allclose(
+            inner["rewards"][: len(buffer)][mask],
+            [1 + 0.5 * 2 + 0.25 * 4, 2 + 0.5 * 4 + 0.25 * 8, 4 + 0.5 * 8, 8],
+        )
+        np.testing.assert_array_equal(
+            inner["dones"][: len(buffer)][mask], [False, True, True, True]
+        )
+        # the flushed tails span fewer steps
+        np.testing.assert_array_equal(
+            inner["info_n_steps"][: len(buffer)][mask], [3, 3, 2, 1]
+        )
+        # env 1 has emitted the two windows that are complete
+        self.assertEqual(len(buffer), 6)
+        self.assertEqual(len(buffer.pending[1]), 2)
+        *columns, n_steps = buffer.sample(4)
+        self.assertEqual(len(columns[0]), 4)
+        self.assertTrue(np.all(np.isin(n_steps, [1, 2, 3])))
+
+    def test_rejects_empty_window(self):
+        with self.assertRaises(ValueError):
+            NStepBuffer(n_steps=0, capacity=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import (
+    SparseTransitions,
+    SweepRecorder,
+    TabularMDP,
+    model_nbytes,
+    predecessors,
+)
+from rl_exercises.week_2 import MyEnv, PolicyIteration, ValueIteration
+
+
+class TestTabularMDP(unittest.TestCase):
+    def test_predecessors(self):
+        rng = np.random.default_rng(0)
+        T = rng.random((6, 2, 6)) * (rng.random((6, 2, 6)) < 0.3)
+        expected = T.max(axis=1).T
+        np.testing.assert_array_equal(predecessors(T).toarray(), expected)
+        np.testing.assert_array_equal(
+            predecessors(SparseTransitions.from_dense(T)).toarray(), expected
+        )
+
+    def test_predecessor_pairs(self):
+        env = MarsRover(
+            transition_probabilities=np.full((6, 2), 0.8), rewards=np.arange(6)
+        )
+        T = env.get_transition_matrix()
+        for model in [T, env.get_transition_matrix(sparse=True)]:
+            pairs = predecessors(model, by_action=True).toarray()
+            np.testing.assert_allclose(pairs, T.reshape(12, 6).T)
+            np.testing.assert_allclose(predecessors(model).toarray(), T.max(axis=1).T)
+
+        # a successor repeated in two slots of one (s, a) counts once, summed
+        T = SparseTransitions(
+            next_states=[[[1, 1]], [[0, 1]]], probs=[[[0.5, 0.5]], [[0.4, 0.6]]]
+        )
+        np.testing.assert_allclose(predecessors(T).toarray(), [[0, 0.4], [1, 0.6]])
+
+    def test_from_env(self):
+        env = MarsRover()
+        mdp = TabularMDP.from_env(env, gamma=0.5)
+        np.testing.assert_array_equal(mdp.T, env.get_transition_matrix())
+        np.testing.assert_array_equal(mdp.R_sa, env.get_reward_per_action())
+        self.assertEqual((mdp.n_states, mdp.n_actions, mdp.gamma), (5, 2, 0.5))
+        self.assertIsInstance(
+            TabularMDP.from_env(env, sparse=True).T, SparseTransitions
+        )
+        self.assertEqual(TabularMDP.from_env(MyEnv()).n_states, 2)
+
+        with self.assertRaises(ValueError):
+            TabularMDP(mdp.T, mdp.R_sa[:3])
+
+    def test_index_is_built_once_and_shared(self):
+        mdp = TabularMDP.from_env(MarsRover())
+        with mock.patch("rl_exercises.mdp.predecessors", wraps=predecessors) as build:
+            index = mdp.predecessors
+            self.assertIs(mdp.with_gamma(0.5).predecessors, index)
+            self.assertEqual(build.call_count, 1)
+
+    def test_agents_share_mdp(self):
+        env = MarsRover()
+        mdp = TabularMDP.from_env(env, gamma=0.8)
+        vi = ValueIteration(env=env, mdp=mdp, mode="prioritized")
+        pi = PolicyIteration(env=env, mdp=mdp)
+        with mock.patch.object(env, "get_transition_matrix") as extract:
+            vi.update_agent()
+            pi.update_agent()
+            extract.assert_not_called()
+        self.assertEqual(vi.gamma, 0.8)
+        self.assertIs(vi.T, pi.T)
+        np.testing.assert_array_equal(vi.pi, pi.pi)
+
+        # refit extracts the changed MDP from the environment
+        env.rewards = env.rewards[::-1]
+        vi.update_agent(refit=True)
+        self.assertIsNot(vi.mdp, mdp)
+        np.testing.assert_array_equal(vi.R_sa, env.get_reward_per_action())
+
+    def test_sweep_recorder(self):
+        recorder = SweepRecorder(capacity=2)
+        recorder.start()
+        for i in range(5):
+            recorder.record(1.0 / (i + 1), i, 8)
+        self.assertEqual(len(recorder), 5)
+        self.assertEqual(len(recorder.records), 8)
+        np.testing.assert_array_equal(recorder.data["policy_changes"], range(5))
+        self.assertTrue(np.all(recorder.data["time"] >= 0))
+        recorder.reset()
+        self.assertEqual(len(recorder.data), 0)
+
+        T = SparseTransitions(next_states=[[[1]], [[0]]], probs=[[[1.0]], [[1.0]]])
+        self.assertEqual(model_nbytes(T, None, np.zeros(3)), T.nbytes + 24)
+        self.assertEqual(model_nbytes(predecessors(T)), 2 * 8 + 2 * 4 + 3 * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
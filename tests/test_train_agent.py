@@ -0,0 +1,241 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from hydra import compose, initialize_config_dir
+from omegaconf import OmegaConf
+from rl_exercises.agent import AbstractAgent, NStepBuffer, SimpleBuffer
+from rl_exercises import train_agent
+from rl_exercises.environments import MarsRover, MarsRoverVec, unbatch_info
+from rl_exercises.train_agent import (
+    Evaluator,
+    evaluate,
+    evaluate_from_config,
+    evaluate_vectorized,
+    make_eval_env,
+    make_vec_env,
+    train_vectorized,
+)
+from rl_exercises.week_2 import PolicyIteration, ValueIteration
+
+
+class RandomAgent(AbstractAgent):
+    def __init__(self, env):
+        self.env = env
+        self.rng = np.random.default_rng(0)
+
+    def predict_action(self, state, info=None, evaluate=False):
+        return self.rng.integers(self.env.action_space.n), {}
+
+    def save(self, *args, **kwargs):
+        pass
+
+    def load(self, *args, **kwargs):
+        pass
+
+    def update_agent(self, *args, **kwargs):
+        pass
+
+
+class TrainAgentTest(unittest.TestCase):
+    def setUp(self):
+        # Monitor wrappers write their log files to the working directory
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_async_vec_env(self):
+        envs = make_vec_env("CartPole-v1", num_envs=2, vector_mode="async")
+        states, _ = envs.reset(seed=0)
+        self.assertEqual(states.shape, (2, 4))
+        _, rewards, _, _, _ = envs.step(np.zeros(2, dtype=int))
+        self.assertTrue(np.all(rewards == 1))
+        envs.close()
+
+        with self.assertRaises(ValueError):
+            make_vec_env("CartPole-v1", num_envs=2, vector_mode="threads")
+
+    def test_unbatch_info(self):
+        infos = {"x": np.array([1, 2]), "_x": np.array([False, True])}
+        self.assertEqual(unbatch_info(infos, 0), {})
+        self.assertEqual(unbatch_info(infos, 1), {"x": 2})
+
+        # the Monitor's nested "episode" dict at the end of an episode
+        envs = make_vec_env("CartPole-v1", num_envs=2, monitor_filename="train")
+        envs.reset(seed=0)
+        episodes = []
+        for _ in range(100):
+            _, _, terminated, truncated, infos = envs.step(np.zeros(2, dtype=int))
+            for i in np.flatnonzero(terminated | truncated):
+                episodes.append(unbatch_info(infos, i)["episode"])
+        envs.close()
+        self.assertGreater(len(episodes), 0)
+        self.assertEqual(set(episodes[0]), {"r", "l", "t"})
+        self.assertEqual(episodes[0]["r"], episodes[0]["l"])
+
+        # the default predict_actions hands every observation its own info
+        agent = RandomAgent(MarsRover())
+        with mock.patch.object(
+            agent, "predict_action", wraps=agent.predict_action
+        ) as predict_action:
+            actions, _ = agent.predict_actions(
+                np.array([0, 1]), {"x": np.array([1, 2]), "_x": np.ones(2, bool)}
+            )
+        self.assertEqual(len(actions), 2)
+        self.assertEqual(
+            [call.args[1] for call in predict_action.call_args_list],
+            [{"x": 1}, {"x": 2}],
+        )
+
+    def test_vectorized_evaluation(self):
+        """Lock-step evaluation matches the sequential loop on deterministic dynamics."""
+        env = MarsRover()
+        agent = ValueIteration(env=env, seed=0)
+        agent.update_agent()
+        mean_r = evaluate(env=env, agent=agent, episodes=3)
+
+        stats = evaluate_vectorized(MarsRoverVec(num_envs=4), agent, episodes=10)
+        self.assertAlmostEqual(stats["mean"], mean_r)
+        self.assertAlmostEqual(stats["std"], 0.0)
+        self.assertEqual(stats["min"], stats["max"])
+        with self.assertRaises(ValueError):
+            evaluate_vectorized(MarsRoverVec(num_envs=4), agent, episodes=0)
+
+    def test_train_vectorized(self):
+        cfg = OmegaConf.create(
+            {
+                "training_steps": 48,
+                "batch_size": 0,
+                "update_after_episode_end": False,
+                "eval_every_n_steps": 1000,
+                "n_eval_envs": 1,
+                "n_eval_episodes": 1,
+                "env_name": "MarsRover",
+                "env_kwargs": {},
+            }
+        )
+        agent = ValueIteration(MarsRover())
+        envs = make_vec_env("MarsRover", num_envs=4)
+        buffer = NStepBuffer(n_steps=1, gamma=1.0)
+        train_vectorized(envs, agent, buffer, cfg, Evaluator(cfg, make_eval_env(cfg)))
+        # Horizon 10: the autoreset step after each episode end is dropped
+        self.assertEqual(len(buffer), 48 - 4)
+        self.assertTrue(agent.policy_fitted)
+
+        agent = ValueIteration(MarsRover())
+        buffer = SimpleBuffer()
+        train_vectorized(
+            make_vec_env("MarsRover", num_envs=2),
+            agent,
+            buffer,
+            cfg,
+            Evaluator(cfg, make_eval_env(cfg)),
+        )
+        self.assertEqual(len(buffer), 1)
+
+    def test_train_passes_env_kwargs(self):
+        config_dir = os.path.join(os.path.dirname(train_agent.__file__), "configs")
+        with initialize_config_dir(config_dir=config_dir, version_base="1.1"):
+            cfg = compose(
+                "base",
+                overrides=[
+                    "+exercise=w2_value_iteration",
+                    "training_steps=5",
+                    "+env_kwargs.horizon=3",
+                ],
+            )
+        with mock.patch.object(
+            train_agent, "make_env", wraps=train_agent.make_env
+        ) as make_env:
+            train_agent.train(cfg)
+        # the planner's env and the eval env are the configured rover
+        self.assertEqual(make_env.call_count, 2)
+        for call in make_env.call_args_list:
+            self.assertEqual(call.args[1], {"horizon": 3})
+
+    def test_eval_env_is_reused(self):
+        cfg = OmegaConf.create(
+            {
+                "n_eval_envs": 1,
+                "n_eval_episodes": 2,
+                "env_name": "MarsRover",
+                "env_kwargs": {},
+            }
+        )
+        agent = ValueIteration(MarsRover())
+        eval_env = make_eval_env(cfg)
+        first = evaluate_from_config(cfg, agent, eval_env)
+        # the env stays open and logs to its own monitor file
+        second = evaluate_from_config(cfg, agent, eval_env)
+        eval_env.close()
+        self.assertEqual(os.listdir(self.tmp.name), ["eval.monitor.csv"])
+        self.assertEqual(first, second)
+
+        cfg.n_eval_envs = 2
+        eval_env = make_eval_env(cfg)
+        self.assertEqual(eval_env.num_envs, 2)
+        self.assertEqual(
+            evaluate_from_config(cfg, agent, eval_env),
+            evaluate_from_config(cfg, agent, eval_env),
+        )
+        eval_env.close()
+
+    def test_async_evaluator_uses_snapshot(self):
+        cfg = OmegaConf.create(
+            {
+                "n_eval_envs": 1,
+                "n_eval_episodes": 1,
+                "env_name": "MarsRover",
+                "env_kwargs": {},
+            }
+        )
+        agent = ValueIteration(MarsRover())
+        agent.update_agent()
+        reported = []
+        evaluator = Evaluator(
+            cfg,
+            make_eval_env(cfg),
+            asynchronous=True,
+            callback=lambda step, value: reported.append((step, value)),
+        )
+        evaluator.submit(0, agent)
+        # training keeps changing the agent, the evaluation must not see it
+        optimal_pi = agent.pi.copy()
+        agent.pi[:] = 0
+        evaluator.submit(1, agent)
+        results = evaluator.wait()
+        evaluator.close()
+
+        self.assertEqual([step for step, _ in results], [0, 1])
+        self.assertEqual(reported, results)
+        agent.pi = optimal_pi
+        self.assertEqual(
+            results[0][1], evaluate_from_config(cfg, agent, make_eval_env(cfg))
+        )
+        self.assertLess(results[1][1], results[0][1])
+
+    def test_snapshot(self):
+        for agent_class in [ValueIteration, PolicyIteration]:
+            agent = agent_class(MarsRover())
+            snapshot = agent.snapshot()
+            # the original is fitted first, the copy shares its model
+            self.assertTrue(agent.policy_fitted and snapshot.policy_fitted)
+            self.assertIs(snapshot.T, agent.T)
+            self.assertIsNot(snapshot.pi, agent.pi)
+            np.testing.assert_array_equal(snapshot.pi, agent.pi)
+
+        # the default deep copy shares the env
+        agent = RandomAgent(MarsRover())
+        snapshot = agent.snapshot()
+        self.assertIs(snapshot.env, agent.env)
+        self.assertIsNot(snapshot.rng, agent.rng)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,9 @@ import pytest
 from rl_exercises.environments import (  # adjust import path as needed
     MarsRover,
     MarsRoverPartialObsWrapper,
+    MarsRoverVec,
 )
+from rl_exercises.mdp import SparseTransitions, validate_transitions
 
 
 def test_env_has_spaces_and_methods():
@@ -60,6 +62,118 @@ def test_reward_and_transition_methods_exist_and_shape():
     assert np.all(T >= 0) and np.all(T <= 1)
 
 
+def test_sparse_transition_matrix_matches_dense():
+    P = np.random.default_rng(0).random((7, 2))
+    env = MarsRover(transition_probabilities=P, rewards=[0] * 7)
+    T_sparse = env.get_transition_matrix(sparse=True)
+    assert isinstance(T_sparse, SparseTransitions)
+    assert T_sparse.shape == (7, 2, 7)
+    np.testing.assert_array_equal(T_sparse.to_dense(), env.get_transition_matrix())
+    np.testing.assert_array_equal(
+        SparseTransitions.from_dense(T_sparse.to_dense()).to_dense(),
+        T_sparse.to_dense(),
+    )
+
+
+def test_sparse_transition_matrix_scales_with_nonzeros():
+    n = 100_000
+    env = MarsRover(transition_probabilities=np.ones((n, 2)), rewards=np.zeros(n))
+    T = env.get_transition_matrix(sparse=True)
+    assert T.nbytes <= n * 2 * 2 * 16
+
+
+def test_tables_match_explicit_loops():
+    P = np.random.default_rng(1).random((6, 2))
+    rewards = [3, 0, 1, 0, 2, 5]
+    env = MarsRover(transition_probabilities=P, rewards=rewards)
+    T, R = env.get_transition_matrix(), env.get_reward_per_action()
+    for s in range(6):
+        for a in range(2):
+            s_next = max(0, min(5, s + (-1 if a == 0 else 1)))
+            s_flip = max(0, min(5, s + (1 if a == 0 else -1)))
+            assert T[s, a, s_next] == P[s, a]
+            assert np.isclose(T[s, a, s_flip], 1 - P[s, a])
+            assert np.isclose(
+                R[s, a], P[s, a] * rewards[s_next] + (1 - P[s, a]) * rewards[s_flip]
+            )
+
+
+def test_tables_are_cached_until_dynamics_change():
+    env = MarsRover()
+    T, R = env.get_transition_matrix(), env.get_reward_per_action()
+    assert env.get_transition_matrix() is T
+    assert env.get_reward_per_action() is R
+    with pytest.raises(ValueError):
+        T[0, 0, 0] = 0.5
+    with pytest.raises(ValueError):
+        env.P[0, 0] = 0.5
+
+    env.rewards = [0, 0, 0, 0, 1]
+    assert env.get_transition_matrix() is not T
+    assert env.get_reward_per_action()[3, 1] == 1
+
+    env.P = np.full((5, 2), 0.75)
+    assert env.get_transition_matrix().max() == 0.75
+    assert env.T is env.transition_matrix is env.get_transition_matrix()
+
+    T = np.zeros((5, 2, 5))
+    T[:, :, 0] = 1
+    env.T = T
+    np.testing.assert_array_equal(env.get_transition_matrix(), T)
+    np.testing.assert_array_equal(env.get_transition_matrix(sparse=True).to_dense(), T)
+    with pytest.raises(ValueError):
+        env.transition_matrix = np.zeros((5, 5))
+
+
+def test_transitions_are_row_stochastic():
+    P = np.random.default_rng(2).random((8, 2))
+    env = MarsRover(transition_probabilities=P, rewards=np.zeros(8))
+    validate_transitions(env.get_transition_matrix())
+    validate_transitions(env.get_transition_matrix(sparse=True))
+
+    T = env.get_transition_matrix().copy()
+    T[3, 1, :] = 0
+    with pytest.raises(ValueError):
+        validate_transitions(T)
+
+
+def test_vec_env_matches_single_env_when_deterministic():
+    envs = MarsRoverVec(num_envs=3, horizon=4, seed=0)
+    singles = [MarsRover(horizon=4) for _ in range(3)]
+    assert isinstance(envs, gymnasium.vector.VectorEnv)
+
+    obs, _ = envs.reset()
+    np.testing.assert_array_equal(obs, [2, 2, 2])
+    for single in singles:
+        single.reset()
+    actions = np.array([0, 1, 1])
+    for t in range(4):
+        obs, rewards, terminated, truncated, _ = envs.step(actions)
+        assert not terminated.any()
+        for i, single in enumerate(singles):
+            pos, r, _, trunc, _ = single.step(actions[i])
+            assert obs[i] == pos and rewards[i] == r and truncated[i] == trunc
+    assert truncated.all()
+
+    # the step after truncation resets, ignoring the actions
+    obs, rewards, _, truncated, _ = envs.step(actions)
+    np.testing.assert_array_equal(obs, [2, 2, 2])
+    np.testing.assert_array_equal(rewards, 0.0)
+    assert not truncated.any()
+
+    with pytest.raises(RuntimeError):
+        envs.step(np.array([0, 2, 1]))
+
+
+def test_vec_env_flip_probability():
+    envs = MarsRoverVec(
+        num_envs=20_000, transition_probabilities=np.full((5, 2), 0.7), seed=0
+    )
+    envs.reset()
+    obs, *_ = envs.step(np.ones(envs.num_envs, dtype=int))
+    assert abs(np.mean(obs == 3) - 0.7) < 0.02
+
+
 def test_partial_obs_zero_noise():
     """With noise=0, wrapper observations equal true state."""
     base = MarsRover(seed=0)
@@ -55,3 +55,4 @@ def test_reward_and_transition_methods_exist_and_shape():
     )
     # probabilities should be between 0 and 1
     assert np.all(T >= 0) and np.all(T <= 1)
+    np.testing.assert_array_equal(env.get_transition_matrix(sparse=True).to_dense(), T)
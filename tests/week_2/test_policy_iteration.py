@@ -1,13 +1,18 @@
 import unittest
+from unittest import mock
 
 import numpy as np
 from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import SparseTransitions, SweepRecorder
+from rl_exercises.week_2.my_env import MyEnv
 from rl_exercises.train_agent import evaluate
 from rl_exercises.week_2.policy_iteration import (
     PolicyIteration,
     policy_evaluation,
     policy_improvement,
+    policy_iteration,
 )
+from rl_exercises.week_2.value_iteration import value_iteration
 
 
 class TestPolicyIteration(unittest.TestCase):
@@ -49,6 +54,223 @@ class TestPolicyIteration(unittest.TestCase):
         expected_Q00 = R_sa[0, 0] + gamma * V[0]  # s=0,a=0
         self.assertAlmostEqual(Q_new[0, 0], expected_Q00)
 
+    def test_backups_match_explicit_sums(self):
+        """The batched backups should match the per-state Bellman sums."""
+        rng = np.random.default_rng(0)
+        nS, nA, gamma = 6, 3, 0.8
+        T = rng.random((nS, nA, nS))
+        T /= T.sum(axis=2, keepdims=True)
+        R_sa = rng.random((nS, nA))
+        pi = rng.integers(nA, size=nS)
+
+        V = policy_evaluation(pi, T, R_sa, gamma)
+        for s in range(nS):
+            a = pi[s]
+            backup = sum(
+                T[s, a, s_next] * (R_sa[s, a] + gamma * V[s_next])
+                for s_next in range(nS)
+            )
+            self.assertAlmostEqual(V[s], backup, places=6)
+
+        Q, pi_new = policy_improvement(V, T, R_sa, gamma)
+        for s in range(nS):
+            for a in range(nA):
+                expected = sum(
+                    T[s, a, s_next] * (R_sa[s, a] + gamma * V[s_next])
+                    for s_next in range(nS)
+                )
+                self.assertAlmostEqual(Q[s, a], expected)
+        np.testing.assert_array_equal(pi_new, np.argmax(Q, axis=1))
+
+    def test_solve_matches_iterative(self):
+        """Dense and sparse direct solves agree with iterative evaluation."""
+        rng = np.random.default_rng(1)
+        nS, nA, gamma = 20, 2, 0.95
+        T = rng.random((nS, nA, nS))
+        T /= T.sum(axis=2, keepdims=True)
+        R_sa = rng.random((nS, nA))
+        pi = rng.integers(nA, size=nS)
+
+        V_iter = policy_evaluation(pi, T, R_sa, gamma, epsilon=1e-12)
+        V_dense = policy_evaluation(pi, T, R_sa, gamma, method="solve")
+        with mock.patch(
+            "rl_exercises.week_2.policy_iteration.DENSE_SOLVE_MAX_STATES", 0
+        ):
+            V_sparse = policy_evaluation(pi, T, R_sa, gamma, method="solve")
+            V_compact = policy_evaluation(
+                pi, SparseTransitions.from_dense(T), R_sa, gamma, method="solve"
+            )
+        np.testing.assert_allclose(V_dense, V_iter, atol=1e-8)
+        np.testing.assert_allclose(V_sparse, V_iter, atol=1e-8)
+        np.testing.assert_allclose(V_compact, V_iter, atol=1e-8)
+        with self.assertRaises(ValueError):
+            policy_evaluation(pi, T, R_sa, gamma, method="unknown")
+
+    def test_agent_picks_eval_method(self):
+        agent = PolicyIteration(env=MarsRover())
+        self.assertEqual(agent.eval_method, "solve")
+        agent = PolicyIteration(env=MarsRover(), eval_method="iterative")
+        agent.update_agent()
+        self.assertTrue(agent.policy_fitted)
+
+    def test_sparse_transitions_give_same_policy(self):
+        env = MarsRover()
+        dense = PolicyIteration(env=env, sparse=False)
+        sparse = PolicyIteration(env=env, sparse=True)
+        dense.update_agent()
+        sparse.update_agent()
+        np.testing.assert_array_equal(dense.pi, sparse.pi)
+        np.testing.assert_allclose(dense.Q, sparse.Q)
+
+        agent = PolicyIteration(env=MyEnv(), sparse=True)
+        agent.update_agent()
+        np.testing.assert_array_equal(agent.pi, [1, 1])
+
+        # an assigned model replaces both formats
+        T = np.random.default_rng(0).random((5, 2, 5))
+        env.T = T / T.sum(axis=2, keepdims=True)
+        dense = PolicyIteration(env=env, sparse=False)
+        sparse = PolicyIteration(env=env, sparse=True)
+        dense.update_agent()
+        sparse.update_agent()
+        np.testing.assert_array_equal(dense.pi, sparse.pi)
+        np.testing.assert_allclose(dense.Q, sparse.Q)
+
+    def test_predict_actions_batch(self):
+        agent = PolicyIteration(env=MarsRover())
+        agent.update_agent()
+        observations = np.array([0, 1, 2, 3, 4, 2])
+        actions, info = agent.predict_actions(observations)
+        np.testing.assert_array_equal(actions, agent.pi[observations])
+        self.assertEqual(info, {})
+
+        # the AbstractAgent fallback loops over predict_action
+        fallback, _ = super(PolicyIteration, agent).predict_actions(observations)
+        np.testing.assert_array_equal(fallback, actions)
+
+    def test_warm_start(self):
+        env = MarsRover(
+            transition_probabilities=np.full((20, 2), 0.8),
+            rewards=np.linspace(0, 1, 20),
+        )
+        cold = PolicyIteration(env=env, eval_method="iterative")
+        cold.update_agent()
+        warm = PolicyIteration(env=env, initial_policy=cold.pi)
+        warm.update_agent()
+        # the optimal policy is confirmed by a single improvement step
+        self.assertEqual(warm.steps, 1)
+        np.testing.assert_array_equal(warm.pi, cold.pi)
+
+        # refit reuses policy and values after the rewards change
+        env.rewards = np.linspace(0, 1, 20) ** 1.1
+        cold_pi = cold.pi
+        cold.update_agent()
+        self.assertIs(cold.pi, cold_pi)
+        cold.update_agent(refit=True)
+        fresh = PolicyIteration(env=env)
+        fresh.update_agent()
+        np.testing.assert_array_equal(cold.pi, fresh.pi)
+        self.assertLess(cold.steps, fresh.steps)
+
+    def test_modified_policy_iteration(self):
+        """Bounded evaluation sweeps reach the same solution, k=1 is value iteration."""
+        rng = np.random.default_rng(0)
+        env = MarsRover(
+            transition_probabilities=np.full((20, 2), 0.8), rewards=rng.random(20)
+        )
+        T = env.get_transition_matrix()
+        R_sa = env.get_reward_per_action()
+        S, A = np.arange(20), np.arange(2)
+
+        def solve(**kwargs):
+            return policy_iteration(
+                np.zeros((20, 2)),
+                np.zeros(20, dtype=int),
+                (S, A, T, R_sa, 0.9),
+                eval_method="iterative",
+                **kwargs,
+            )
+
+        Q_full, pi_full, _ = solve()
+        for k in [1, 3, 10]:
+            Q_k, pi_k, _ = solve(eval_sweeps=k)
+            np.testing.assert_array_equal(pi_k, pi_full)
+            np.testing.assert_allclose(Q_k, Q_full, atol=1e-6)
+
+        V_vi, _ = value_iteration(T=T, R_sa=R_sa, gamma=0.9)
+        Q_1, pi_1, _ = solve(eval_sweeps=1)
+        np.testing.assert_allclose(Q_1[S, pi_1], V_vi, atol=1e-6)
+
+        with self.assertRaises(ValueError):
+            policy_evaluation(pi_full, T, R_sa, 0.9, method="solve", max_sweeps=1)
+        for eval_sweeps in [0, -1]:
+            with self.assertRaises(ValueError):
+                solve(eval_sweeps=eval_sweeps)
+            with self.assertRaises(ValueError):
+                PolicyIteration(env=env, eval_sweeps=eval_sweeps)
+        with self.assertRaises(ValueError):
+            policy_evaluation(pi_full, T, R_sa, 0.9, max_sweeps=0)
+
+        agent = PolicyIteration(env=env, eval_sweeps=5)
+        self.assertEqual(agent.eval_method, "iterative")
+        agent.update_agent()
+        np.testing.assert_array_equal(agent.pi, pi_full)
+
+    def test_span_stopping(self):
+        rng = np.random.default_rng(0)
+        env = MarsRover(
+            transition_probabilities=np.full((50, 2), 0.8), rewards=rng.random(50)
+        )
+        T = env.get_transition_matrix()
+        R_sa = env.get_reward_per_action()
+        pi = rng.integers(2, size=50)
+        V = policy_evaluation(pi, T, R_sa, 0.99, method="solve")
+        for epsilon in [1e-3, 1e-8]:
+            V_span = policy_evaluation(pi, T, R_sa, 0.99, epsilon, stopping="span")
+            self.assertLess(np.max(np.abs(V_span - V)), epsilon / 2)
+        with self.assertRaises(ValueError):
+            policy_evaluation(pi, T, R_sa, 0.99, stopping="relative")
+
+        agent = PolicyIteration(env=env, eval_method="iterative", eval_stopping="span")
+        agent.update_agent()
+        exact = PolicyIteration(env=env, eval_method="solve")
+        exact.update_agent()
+        np.testing.assert_array_equal(agent.pi, exact.pi)
+        self.assertEqual(exact.info, {"eval_sweeps": 0, "sweeps_saved": 0})
+
+        # on a fast-mixing chain the span rule saves max-norm sweeps
+        env = MarsRover(
+            transition_probabilities=np.full((10, 2), 0.5), rewards=rng.random(10)
+        )
+        T = env.get_transition_matrix()
+        R_sa = env.get_reward_per_action()
+        pi = rng.integers(2, size=10)
+        _, span = policy_evaluation(
+            pi, T, R_sa, 0.99, stopping="span", return_info=True
+        )
+        _, full = policy_evaluation(pi, T, R_sa, 0.99, return_info=True)
+        self.assertEqual(span["stop_reason"], "span")
+        self.assertEqual(full["sweeps_saved"], 0)
+        # the contraction estimate is close to the sweeps actually saved
+        self.assertLess(abs(span["sweeps"] + span["sweeps_saved"] - full["sweeps"]), 10)
+        agent = PolicyIteration(
+            env=env, gamma=0.99, eval_method="iterative", eval_stopping="span"
+        )
+        agent.update_agent()
+        self.assertGreater(agent.info["sweeps_saved"], 0)
+
+    def test_recorder(self):
+        env = MarsRover(
+            transition_probabilities=np.full((20, 2), 0.8), rewards=np.arange(20)
+        )
+        agent = PolicyIteration(env=env, recorder=SweepRecorder())
+        agent.update_agent()
+        data = agent.recorder.data
+        self.assertEqual(len(data), agent.steps)
+        self.assertEqual(data["policy_changes"][-1], 0)
+        self.assertGreater(data["policy_changes"][0], 0)
+        self.assertTrue(np.all(data["nbytes"] == data["nbytes"][0]))
+
 
 if __name__ == "__main__":
     unittest.main()
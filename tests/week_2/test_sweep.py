@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from rl_exercises.environments import MarsRover
+from rl_exercises.week_2.policy_iteration import PolicyIteration
+from rl_exercises.week_2.sweep import sweep
+from rl_exercises.week_2.value_iteration import value_iteration
+
+
+class TestSweep(unittest.TestCase):
+    def test_matches_sequential_solves(self):
+        env_kwargs = [{}, {"transition_probabilities": np.full((5, 2), 0.8)}]
+        gammas = [0.1, 0.5, 0.9]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sweep.csv")
+            table = sweep(gammas, env_kwargs=env_kwargs, max_workers=2, path=path)
+            stored = pd.read_csv(path)
+        pd.testing.assert_frame_equal(
+            stored.drop(columns="policy"), table.drop(columns="policy")
+        )
+        for policy, pi in zip(stored.policy, table.policy):
+            np.testing.assert_array_equal(np.array(policy.split(), dtype=int), pi)
+
+        self.assertEqual(len(table), len(env_kwargs) * len(gammas))
+        for row in table.itertuples():
+            env = MarsRover(**env_kwargs[row.env])
+            V, pi = value_iteration(
+                T=env.get_transition_matrix(),
+                R_sa=env.get_reward_per_action(),
+                gamma=row.gamma,
+                epsilon=row.epsilon,
+            )
+            self.assertAlmostEqual(row.value_mean, np.mean(V))
+            np.testing.assert_array_equal(row.policy, pi)
+
+    def test_policy_iteration(self):
+        table = sweep([0.9], planner="policy_iteration", max_workers=1)
+        agent = PolicyIteration(MarsRover(), gamma=0.9)
+        agent.update_agent()
+        np.testing.assert_array_equal(table.policy[0], agent.pi)
+        self.assertEqual(table.steps[0], agent.steps)
+
+        with self.assertRaises(ValueError):
+            sweep([0.9], planner="q_learning")
+
+
+if __name__ == "__main__":
+    unittest.main()
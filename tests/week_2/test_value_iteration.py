@@ -1,8 +1,16 @@
+import os
+import tempfile
 import unittest
 
+import numpy as np
 from rl_exercises.environments import MarsRover
+from rl_exercises.mdp import SweepRecorder
 from rl_exercises.train_agent import evaluate
-from rl_exercises.week_2.value_iteration import ValueIteration
+from rl_exercises.week_2.value_iteration import (
+    ValueIteration,
+    value_iteration,
+    value_iteration_batched,
+)
 
 
 class TestValueIteration(unittest.TestCase):
@@ -16,3 +24,218 @@ class TestValueIteration(unittest.TestCase):
             mean_r = evaluate(env=env, agent=agent, episodes=1)
             r.append(mean_r)
         self.assertTrue(sum(r) > 0)
+
+    def test_modes_agree(self):
+        """Jacobi and Gauss-Seidel sweeps should reach the same fixed point."""
+        env = MarsRover()
+        T = env.get_transition_matrix()
+        R_sa = env.get_reward_per_action()
+        V_j, pi_j = value_iteration(T=T, R_sa=R_sa, gamma=0.9, seed=0, mode="jacobi")
+        V_gs, pi_gs = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.9, seed=0, mode="gauss-seidel"
+        )
+        np.testing.assert_allclose(V_j, V_gs, atol=1e-6)
+        np.testing.assert_array_equal(pi_j, pi_gs)
+        with self.assertRaises(ValueError):
+            value_iteration(T=T, R_sa=R_sa, gamma=0.9, mode="unknown")
+
+    def test_prioritized_sweeping(self):
+        """Residual-ordered backups reach the fixed point with fewer backups."""
+        # Only the last state is rewarding. Far from it all values stay below
+        # epsilon, and only prioritized sweeping never backs those states up.
+        n_states = 300
+        rewards = np.zeros(n_states)
+        rewards[-1] = 1.0
+        env = MarsRover(
+            transition_probabilities=np.full((n_states, 2), 0.8), rewards=rewards
+        )
+        R_sa = env.get_reward_per_action()
+        T = env.get_transition_matrix(sparse=True)
+        V, pi, info = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.9, seed=0, return_info=True
+        )
+        V_p, pi_p, info_p = value_iteration(
+            T=T,
+            R_sa=R_sa,
+            gamma=0.9,
+            seed=0,
+            mode="prioritized",
+            return_info=True,
+        )
+        np.testing.assert_allclose(V_p, V, atol=1e-6)
+        # elsewhere both actions are worth ~0 and ties are broken at random
+        reached = V > 1e-6
+        np.testing.assert_array_equal(pi_p[reached], pi[reached])
+        self.assertLess(info_p["iterations"], info["iterations"] * n_states / 5)
+
+        agent = ValueIteration(env=env, mode="prioritized")
+        agent.update_agent()
+        self.assertEqual(agent.steps, info_p["iterations"])
+
+    def test_random_tie_breaking(self):
+        """Ties are broken uniformly, so both actions show up across states."""
+        n_states = 200
+        T = np.zeros((n_states, 2, n_states))
+        T[np.arange(n_states), :, np.arange(n_states)] = 1.0
+        R_sa = np.ones((n_states, 2))
+        V, pi = value_iteration(T=T, R_sa=R_sa, gamma=0.5, seed=0)
+        np.testing.assert_allclose(V, 2.0)
+        self.assertTrue(0 < pi.sum() < n_states)
+
+    def test_sparse_transitions(self):
+        env = MarsRover()
+        R_sa = env.get_reward_per_action()
+        T_sparse = env.get_transition_matrix(sparse=True)
+        for mode in ["jacobi", "gauss-seidel"]:
+            V_dense, pi_dense = value_iteration(
+                T=env.get_transition_matrix(), R_sa=R_sa, gamma=0.9, seed=0, mode=mode
+            )
+            V_sparse, pi_sparse = value_iteration(
+                T=T_sparse, R_sa=R_sa, gamma=0.9, seed=0, mode=mode
+            )
+            np.testing.assert_allclose(V_dense, V_sparse)
+            np.testing.assert_array_equal(pi_dense, pi_sparse)
+
+    def test_batched_gammas(self):
+        """Each gamma of the batch matches its own run and stops on its own."""
+        env = MarsRover(transition_probabilities=np.full((5, 2), 0.8))
+        R_sa = env.get_reward_per_action()
+        gammas = np.array([0.0, 0.5, 0.9, 0.99])
+        for T in [env.get_transition_matrix(), env.get_transition_matrix(sparse=True)]:
+            V, pi, iterations = value_iteration_batched(
+                T=T, R_sa=R_sa, gammas=gammas, seed=0
+            )
+            self.assertEqual(V.shape, (4, 5))
+            for k, gamma in enumerate(gammas):
+                V_k, pi_k = value_iteration(T=T, R_sa=R_sa, gamma=gamma, seed=0)
+                np.testing.assert_allclose(V[k], V_k)
+                np.testing.assert_array_equal(pi[k], pi_k)
+            # gamma = 0 converges after one update, seen by the second sweep
+            self.assertEqual(iterations[0], 2)
+            self.assertTrue(np.all(np.diff(iterations) > 0))
+
+    def test_warm_start(self):
+        env = MarsRover(
+            transition_probabilities=np.full((20, 2), 0.8),
+            rewards=np.linspace(0, 1, 20),
+        )
+        T = env.get_transition_matrix()
+        R_sa = env.get_reward_per_action()
+        V, pi, cold_info = value_iteration(T=T, R_sa=R_sa, gamma=0.9, return_info=True)
+        V_warm, pi_warm, warm_info = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.9, V0=V, return_info=True
+        )
+        self.assertEqual(warm_info["iterations"], 1)
+        np.testing.assert_allclose(V_warm, V)
+        np.testing.assert_array_equal(pi_warm, pi)
+
+        agent = ValueIteration(env=env)
+        agent.update_agent()
+        self.assertEqual(agent.steps, cold_info["iterations"])
+        with tempfile.TemporaryDirectory() as tmp:
+            agent.filename = os.path.join(tmp, "vi.npz")
+            agent.save()
+            loaded = ValueIteration(env=env, filename=agent.filename)
+            loaded.load()
+        np.testing.assert_array_equal(loaded.V, agent.V)
+        np.testing.assert_array_equal(loaded.pi, agent.pi)
+        self.assertTrue(loaded.policy_fitted)
+
+        # a small reward change needs fewer sweeps from the loaded values
+        env.rewards = np.linspace(0, 1, 20) * 1.01
+        loaded.update_agent(refit=True)
+        fresh = ValueIteration(env=env)
+        fresh.update_agent()
+        np.testing.assert_allclose(loaded.V, fresh.V, atol=1e-6)
+        np.testing.assert_array_equal(loaded.pi, fresh.pi)
+        self.assertLess(loaded.steps, fresh.steps)
+
+    def test_stopping_rules(self):
+        rng = np.random.default_rng(0)
+        env = MarsRover(
+            transition_probabilities=np.full((200, 2), 0.8), rewards=rng.random(200)
+        )
+        T = env.get_transition_matrix(sparse=True)
+        R_sa = env.get_reward_per_action()
+        V, pi, info = value_iteration(T=T, R_sa=R_sa, gamma=0.95, return_info=True)
+        self.assertEqual(info["stop_reason"], "max-norm")
+        self.assertEqual(info["sweeps_saved"], 0)
+
+        for kwargs in [
+            {"stopping": "span", "epsilon": 1e-3},
+            {"stopping": "action-gap"},
+            {"policy_stable_sweeps": 5},
+        ]:
+            _, pi_k, info_k = value_iteration(
+                T=T, R_sa=R_sa, gamma=0.95, return_info=True, **kwargs
+            )
+            np.testing.assert_array_equal(pi_k, pi)
+            self.assertLess(info_k["iterations"], info["iterations"])
+            if "epsilon" not in kwargs:
+                self.assertGreater(info_k["sweeps_saved"], 0)
+        self.assertEqual(info_k["stop_reason"], "policy-stable")
+
+        # the midpoint correction puts V within epsilon / 2 of V*
+        V_span, _ = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.95, stopping="span", epsilon=1e-3
+        )
+        self.assertLess(np.max(np.abs(V_span - V)), 0.5e-3)
+
+        # from V*, action-gap is checked before max-norm, which also holds
+        _, pi_gap, info_gap = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.95, V0=V, stopping="action-gap", return_info=True
+        )
+        self.assertEqual(info_gap["stop_reason"], "action-gap")
+        self.assertEqual(info_gap["iterations"], 1)
+        np.testing.assert_array_equal(pi_gap, pi)
+
+        agent = ValueIteration(env=env, gamma=0.95, stopping="action-gap")
+        agent.update_agent()
+        self.assertEqual(agent.info["stop_reason"], "action-gap")
+        self.assertEqual(agent.steps, agent.info["iterations"])
+
+        with self.assertRaises(ValueError):
+            value_iteration(T=T, R_sa=R_sa, gamma=0.95, stopping="relative")
+        with self.assertRaises(ValueError):
+            value_iteration(
+                T=T, R_sa=R_sa, gamma=0.95, mode="gauss-seidel", stopping="span"
+            )
+
+    def test_recorder(self):
+        env = MarsRover(
+            transition_probabilities=np.full((50, 2), 0.8), rewards=np.arange(50)
+        )
+        T = env.get_transition_matrix(sparse=True)
+        R_sa = env.get_reward_per_action()
+        recorder = SweepRecorder()
+        V, _, info = value_iteration(
+            T=T, R_sa=R_sa, gamma=0.9, return_info=True, recorder=recorder
+        )
+        data = recorder.data
+        self.assertEqual(len(data), info["iterations"])
+        self.assertLess(data["residual"][-1], 1e-8)
+        self.assertEqual(data["policy_changes"][0], -1)
+        self.assertEqual(data["policy_changes"][-1], 0)
+        self.assertTrue(np.all(data["policy_changes"][1:] >= 0))
+        self.assertTrue(np.all(data["nbytes"] > T.nbytes))
+
+        for mode in ["gauss-seidel", "prioritized"]:
+            recorder.reset()
+            V_m, _, info_m = value_iteration(
+                T=T,
+                R_sa=R_sa,
+                gamma=0.9,
+                mode=mode,
+                recorder=recorder,
+                return_info=True,
+            )
+            np.testing.assert_allclose(V_m, V, atol=1e-6)
+            self.assertLess(recorder.data["residual"][-1], 1e-6)
+            self.assertEqual(recorder.data["policy_changes"][0], -1)
+        # one record per 50 backups and one for the partial last batch
+        self.assertEqual(len(recorder.data), -(-info_m["iterations"] // 50))
+        self.assertTrue(np.all(recorder.data["policy_changes"] == -1))
+
+        agent = ValueIteration(env=env, recorder=SweepRecorder())
+        agent.update_agent()
+        self.assertEqual(len(agent.recorder), agent.steps)